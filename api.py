@@ -1,13 +1,53 @@
-from flask import Flask, request, jsonify
+import logging
+import time
+
+from flask import Flask, Response, g, request, jsonify
 from hangman_ai import HangmanAI
+from game_sessions import SessionStore
+from guess_metrics import profiler_from_env
+from guess_service import (BadRequest, GuessService, is_admin, lazy_general_from_env, parse_batch_request,
+                           parse_guess_request, watch_corpora_from_env)
+from structured_logging import bind_request_id, configure_logging, unbind_request_id
+
+# JSON log lines on stderr (see structured_logging.configure_logging for the settings).
+configure_logging()
+logger = logging.getLogger("api")
 
 # Initializing Flask App
 app = Flask(__name__)
 
 # Create a Single, Global Instance of the App. App loads corpus files at the start only once.
-print("Starting the Flask server. Please wait while the Algo model loads.")
-ai_model = HangmanAI()
-print("Algo model loaded. Server is ready.")
+# The general corpus loads in the background: until it is ready, guesses that need it are
+# answered from the fallback tiers and flagged 'degraded' (see /health/ready).
+logger.info("Starting the Flask server. Please wait while the Algo model loads.")
+ai_model = HangmanAI(lazy_general=lazy_general_from_env())
+watch_corpora_from_env(ai_model)
+logger.info("Algo model loaded. Server is ready.")
+
+# Game sessions for clients that opt in by sending a 'gameId' (null to start a new game).
+sessions = SessionStore(max_sessions=10000, ttl_seconds=1800)
+service = GuessService(ai_model, sessions, profiler=profiler_from_env())
+
+
+@app.before_request
+def start_request():
+    """Tags everything logged while serving the request with its id (the client's 'X-Request-ID', if sent)."""
+    g.request_id, g.request_id_token = bind_request_id(request.headers.get('X-Request-ID'))
+    g.started = time.perf_counter()
+
+
+@app.after_request
+def finish_request(response):
+    response.headers['X-Request-ID'] = g.request_id
+    logger.debug("%s %s %d", request.method, request.path, response.status_code,
+                 extra={"status": response.status_code, "seconds": time.perf_counter() - g.started})
+    return response
+
+
+@app.teardown_request
+def end_request(error=None):
+    if 'request_id_token' in g:
+        unbind_request_id(g.request_id_token)
 
 
 # Definining API Endpoint
@@ -16,29 +56,66 @@ def handle_guess():
     """
     To Handle a request to make a hangman guess.
     It expects a JSON payload with 'currentWordState' and 'guessedLetters'.
+
+    Clients can opt into session mode by also sending 'gameId' (null on the first turn).
+    The response then carries the game's 'gameId', and the server only narrows down
+    the candidates that survived the game's previous guess. An optional 'strategy'
+    selects the letter scoring strategy for this guess.
+    """
+    # 1. Get data from incoming request and validate it
+    try:
+        fields = parse_guess_request(request.get_json())
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    # 2. Use the App to make a guess and return the response
+    return jsonify(service.guess(fields))
+
+
+@app.route('/guess/batch', methods=['POST'])
+def handle_guess_batch():
+    """
+    To Handle many hangman guesses, one per game, in a single request.
+    It expects a JSON payload with 'games', an array of objects that each have
+    'currentWordState' and 'guessedLetters', and an optional 'strategy'.
+    The response holds 'nextGuesses', in the same order as 'games'.
+    """
+    try:
+        states, strategy = parse_batch_request(request.get_json())
+    except BadRequest as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(service.guess_batch(states, strategy=strategy))
+
+
+@app.route('/admin/reload', methods=['POST'])
+def handle_reload():
+    """
+    To reload the corpora without restarting the server. The new corpora are loaded in
+    the background and swapped in atomically; requests already running finish on the
+    old ones. Requires the 'X-Admin-Token' header to match HANGMAN_ADMIN_TOKEN.
+    """
+    if not is_admin(request.headers.get('X-Admin-Token')):
+        return jsonify({"error": "Forbidden."}), 403
+    return jsonify(service.reload()), 202
+
+
+@app.route('/health/ready', methods=['GET'])
+def handle_ready():
+    """
+    To report readiness. The server answers guesses once the airline corpus is loaded;
+    'general' tells whether the general corpus is still loading in the background.
+    """
+    return jsonify(service.health())
+
+
+@app.route('/metrics', methods=['GET'])
+def handle_metrics():
+    """
+    To expose guess latency per stage and tier, candidate set sizes and cache statistics
+    in the Prometheus text format.
     """
-    # 1. Get data from incoming request
-    data = request.get_json()
-    
-    if not data:
-        return jsonify({"error": "Invalid request: No JSON payload received."}), 400
-
-    current_word_state = data.get('currentWordState')
-    guessed_letters = data.get('guessedLetters')
-    
-    # 2. Validate input
-    if current_word_state is None or guessed_letters is None:
-        return jsonify({"error": "Invalid request: Missing 'currentWordState' or 'guessedLetters'."}), 400
-
-    # 3. Use the App to make a guess
-    next_guess = ai_model.make_guess(current_word_state, guessed_letters)
-    
-    # 4. Format and return the response
-    response = {
-        "nextGuess": next_guess
-    }
-    
-    return jsonify(response)
+    return Response(service.metrics(), mimetype='text/plain; version=0.0.4')
 
 
 # Run the Flask App 
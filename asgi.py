@@ -0,0 +1,293 @@
+import argparse
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from game_sessions import SessionStore
+from guess_metrics import profiler_from_env
+from structured_logging import configure_logging, current_request_id, request_context
+from guess_service import (BadRequest, GuessService, is_admin, lazy_general_from_env, parse_batch_request,
+                           parse_guess_request, watch_corpora_from_env)
+
+logger = logging.getLogger("asgi")
+
+# Largest request body accepted (a full /guess/batch fits comfortably).
+MAX_BODY_BYTES = 4 * 1024 * 1024
+
+
+# In "process" mode every pool process holds its own model, built by the pool initializer.
+_process_service = None
+
+def _init_process_worker(model_options):
+    global _process_service
+    from hangman_ai import HangmanAI
+    ai_model = HangmanAI(**model_options)
+    watch_corpora_from_env(ai_model)
+    _process_service = GuessService(ai_model, profiler=profiler_from_env())
+
+def _process_call(request_id, method, *args, **kwargs):
+    with request_context(request_id):
+        return getattr(_process_service, method)(*args, **kwargs)
+
+def _process_ping():
+    return True
+
+
+class HangmanApp:
+    """
+    An ASGI application serving the same /guess and /guess/batch contract as api.py.
+
+    The event loop only parses requests and writes responses; every make_guess call runs
+    on an executor, either a thread pool sharing one model ("thread") or a process pool
+    with one model per process ("process"), so CPU-heavy guesses never block the loop.
+    The corpora are loaded in the background at startup: /health/live answers right
+    away, while /health/ready and the guess endpoints report 503 until loading is done.
+    With the "lazy_general" model option, loading is done once the airline corpus is in;
+    the general corpus keeps loading behind it, and with the thread executor
+    /health/ready reports its state as 'general'.
+
+    Session mode needs the sessions and the model in one process, so it is only stateful
+    with the thread executor; with the process executor the gameId is echoed back and
+    guesses are computed statelessly (they are the same guesses, just not incremental).
+    """
+
+    def __init__(self, executor="thread", pool_size=None, model_options=None):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor '{executor}'. Choose 'thread' or 'process'.")
+        self.executor_kind = executor
+        self.pool_size = pool_size or os.cpu_count() or 1
+        self.model_options = model_options or {}
+        self.executor = None
+        self.service = None
+        self.ready = False
+        self.load_error = None
+        self._loading = None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            self._ensure_started()
+            await self._handle_http(scope, receive, send)
+
+    # --- Startup and shutdown ---
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._ensure_started()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.executor is not None:
+                    self.executor.shutdown(wait=False, cancel_futures=True)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _ensure_started(self):
+        """Creates the executor and starts loading the model in the background (once)."""
+        if self._loading is not None:
+            return
+        if self.executor_kind == "thread":
+            self.executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="hangman")
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=self.pool_size, initializer=_init_process_worker,
+                                                initargs=(self.model_options,))
+        self._loading = asyncio.get_running_loop().create_task(self._load())
+
+    async def _load(self):
+        loop = asyncio.get_running_loop()
+        try:
+            if self.executor_kind == "thread":
+                self.service = await loop.run_in_executor(self.executor, self._build_service)
+            else:
+                # One ping per process; a process only runs a task once its initializer has loaded the model.
+                await asyncio.gather(*(loop.run_in_executor(self.executor, _process_ping)
+                                       for _ in range(self.pool_size)))
+            self.ready = True
+        except Exception as e:
+            logger.exception("Error loading the model.")
+            self.load_error = str(e)
+
+    def _build_service(self):
+        from hangman_ai import HangmanAI
+        ai_model = HangmanAI(**self.model_options)
+        watch_corpora_from_env(ai_model)
+        return GuessService(ai_model, SessionStore(max_sessions=10000, ttl_seconds=1800),
+                            profiler=profiler_from_env())
+
+    async def _run(self, method, *args, **kwargs):
+        """Runs a GuessService method on the executor, keeping the request id for its log records."""
+        if self.executor_kind == "thread":
+            call = functools.partial(contextvars.copy_context().run, getattr(self.service, method), *args, **kwargs)
+        else:
+            call = functools.partial(_process_call, current_request_id(), method, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, call)
+
+    # --- HTTP ---
+
+    async def _handle_http(self, scope, receive, send):
+        headers = dict(scope.get("headers") or [])
+        request_id = headers.get(b"x-request-id", b"").decode("latin-1") or None
+        with request_context(request_id):
+            await self._route(scope, receive, send)
+
+    async def _route(self, scope, receive, send):
+        path, method = scope["path"], scope["method"]
+
+        if path == "/health/live":
+            return await self._respond(send, 200, {"status": "alive"})
+        if path == "/health/ready":
+            if self.ready:
+                body = self.service.health() if self.executor_kind == "thread" else {"status": "ready"}
+                return await self._respond(send, 200, body)
+            if self.load_error:
+                return await self._respond(send, 503, {"status": "failed", "error": self.load_error})
+            return await self._respond(send, 503, {"status": "loading"})
+
+        if path == "/metrics":
+            return await self._handle_metrics(method, send)
+        if path == "/admin/reload":
+            return await self._handle_reload(scope, method, send)
+        if path not in ("/guess", "/guess/batch"):
+            return await self._respond(send, 404, {"error": "Not found."})
+        if method != "POST":
+            return await self._respond(send, 405, {"error": "Method not allowed."})
+        if not self.ready:
+            return await self._respond(send, 503, {"error": "Service unavailable: the corpora are still loading."})
+
+        body = await self._read_body(receive)
+        if body is None:
+            return await self._respond(send, 413, {"error": "Request body too large."})
+        try:
+            data = json.loads(body) if body else None
+        except ValueError:
+            return await self._respond(send, 400, {"error": "Invalid request: Body is not valid JSON."})
+
+        try:
+            if path == "/guess":
+                fields = parse_guess_request(data)
+                result = await self._run("guess", fields)
+            else:
+                states, strategy = parse_batch_request(data)
+                result = await self._run("guess_batch", states, strategy=strategy)
+        except BadRequest as e:
+            return await self._respond(send, 400, {"error": str(e)})
+        return await self._respond(send, 200, result)
+
+    async def _handle_metrics(self, method, send):
+        """
+        Serves the Prometheus metrics (see GuessService.metrics). With the process executor
+        every pool process has its own model and metrics, so they are only served by the
+        thread executor.
+        """
+        if method != "GET":
+            return await self._respond(send, 405, {"error": "Method not allowed."})
+        if self.executor_kind != "thread":
+            return await self._respond(send, 501, {"error": "Metrics need the thread executor."})
+        if not self.ready:
+            return await self._respond(send, 503, {"error": "Service unavailable: the corpora are still loading."})
+        # Rendering walks every metric family, so it runs on the executor like a guess.
+        body = (await self._run("metrics")).encode("utf-8")
+        await self._send(send, 200, b"text/plain; version=0.0.4", body)
+
+    async def _handle_reload(self, scope, method, send):
+        """
+        Reloads the corpora in the background (see HangmanAI.reload_corpora). Only the
+        thread executor has a single model to reload; process pools reload through
+        HANGMAN_WATCH_INTERVAL file watching in each process.
+        """
+        if method != "POST":
+            return await self._respond(send, 405, {"error": "Method not allowed."})
+        headers = dict(scope.get("headers") or [])
+        if not is_admin(headers.get(b"x-admin-token", b"").decode("latin-1")):
+            return await self._respond(send, 403, {"error": "Forbidden."})
+        if self.executor_kind != "thread":
+            return await self._respond(send, 501, {"error": "Reload by request needs the thread executor; "
+                                                            "use HANGMAN_WATCH_INTERVAL with process pools."})
+        if not self.ready:
+            return await self._respond(send, 503, {"error": "Service unavailable: the corpora are still loading."})
+        return await self._respond(send, 202, self.service.reload())
+
+    @staticmethod
+    async def _read_body(receive):
+        """Reads the whole request body, or returns None if it exceeds MAX_BODY_BYTES."""
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                break
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                return None
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        return b"".join(chunks)
+
+    @classmethod
+    async def _respond(cls, send, status, payload):
+        await cls._send(send, status, b"application/json", json.dumps(payload).encode("utf-8"))
+
+    @staticmethod
+    async def _send(send, status, content_type, body):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", content_type), (b"content-length", str(len(body)).encode()),
+                        (b"x-request-id", current_request_id().encode("latin-1"))],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_app(executor=None, pool_size=None, data_dir=None, engine=None, strategy=None, tiers=None,
+               lazy_general=None):
+    """
+    App factory for ASGI servers, e.g. `uvicorn asgi:create_app --factory`. Arguments that
+    are not given are read from the environment: HANGMAN_EXECUTOR ("thread" or
+    "process"), HANGMAN_POOL_SIZE, HANGMAN_DATA_DIR, HANGMAN_ENGINE, HANGMAN_STRATEGY,
+    HANGMAN_TIERS ("strict" or "weighted") and HANGMAN_LAZY_GENERAL ("0" to load the
+    general corpus before serving).
+    """
+    configure_logging()
+    pool_size = pool_size or os.environ.get("HANGMAN_POOL_SIZE")
+    return HangmanApp(
+        executor=executor or os.environ.get("HANGMAN_EXECUTOR", "thread"),
+        pool_size=int(pool_size) if pool_size else None,
+        model_options={
+            "data_dir": data_dir or os.environ.get("HANGMAN_DATA_DIR", "data"),
+            "engine": engine or os.environ.get("HANGMAN_ENGINE", "bitmap"),
+            "strategy": strategy or os.environ.get("HANGMAN_STRATEGY", "frequency"),
+            "tiers": tiers or os.environ.get("HANGMAN_TIERS", "strict"),
+            "lazy_general": lazy_general_from_env() if lazy_general is None else lazy_general,
+        },
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs the Hangman guessing API on an ASGI server (uvicorn).")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1, help="Number of server processes.")
+    parser.add_argument("--executor", choices=("thread", "process"), default="thread",
+                        help="Where make_guess runs inside each server process.")
+    parser.add_argument("--pool-size", type=int, default=None, help="Threads or processes in the executor.")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    # The factory is passed by import path so that every server process builds its own app.
+    os.environ["HANGMAN_EXECUTOR"] = args.executor
+    if args.pool_size:
+        os.environ["HANGMAN_POOL_SIZE"] = str(args.pool_size)
+    uvicorn.run("asgi:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import random
+import sys
+import time
+
+from corpus_index import PackedBucket, state_shape
+from filter_engines import ENGINES, Trie
+from hangman_ai import HangmanAI
+from structured_logging import configure_logging
+
+# --- Configuration ---
+DATA_DIR = "data"
+NUM_GAMES = 200
+SEED = 0
+MAX_INCORRECT_GUESSES = 6
+
+
+def mask_for(word, guessed_letters):
+    """Returns the word state a client would send for `word` after `guessed_letters`."""
+    return " ".join(char if char == ' ' or char in guessed_letters else '_' for char in word)
+
+
+def collect_states(ai, words):
+    """
+    Plays one game per word with `ai` and returns every (word state, guessed letters)
+    pair it was asked about, so the engines are compared on realistic game states.
+    """
+    states = []
+    for word in words:
+        guessed, misses = [], 0
+        while misses < MAX_INCORRECT_GUESSES and '_' in mask_for(word, guessed):
+            state = mask_for(word, guessed)
+            states.append((state, list(guessed)))
+            guess = ai.make_guess(state, guessed)
+            if guess in guessed:
+                break
+            guessed.append(guess)
+            misses += guess not in word
+    return states
+
+
+def list_of_str_bytes(bucket):
+    """Returns the size of a bucket held as a list of str: the list plus every string."""
+    return sys.getsizeof(bucket) + sum(sys.getsizeof(word) for word in bucket)
+
+
+def memory_report(corpus):
+    """Returns the bytes of the corpus as lists of str, as packed buckets and as tries, over all its buckets."""
+    as_lists = sum(list_of_str_bytes(list(bucket)) for bucket in corpus.buckets.values())
+    as_packed = sum(PackedBucket(bucket).nbytes() for bucket in corpus.buckets.values())
+    as_tries = sum(Trie(bucket, sum(shape)).nbytes() for shape, bucket in corpus.buckets.items())
+    return as_lists, as_packed, as_tries
+
+
+def benchmark(engine, states, data_dir):
+    """
+    Times one engine: building the per-bucket structures for every shape in `states`,
+    then making a guess for each state with no opening table and no cache, so every
+    guess goes through _get_best_guess_from_corpus.
+    """
+    ai = HangmanAI(data_dir=data_dir, engine=engine, use_openings=False, cache_size=0)
+    shapes = {state_shape(state) for state, _ in states}
+
+    started = time.perf_counter()
+    for corpus in (ai.airlines_corpus, ai.general_corpus):
+        for shape in shapes:
+            if corpus.bucket(shape):
+                ai.engine.prepare(corpus, shape)
+    build_seconds = time.perf_counter() - started
+
+    latencies, guesses = [], []
+    for state, guessed in states:
+        started = time.perf_counter()
+        guesses.append(ai.make_guess(state, guessed))
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return build_seconds, latencies, guesses
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compares the candidate filtering engines on the same game states.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Directory with the corpus files.")
+    parser.add_argument("--games", type=int, default=NUM_GAMES, help="Number of airline words to play.")
+    parser.add_argument("--engines", default="regex,bitmap,trie",
+                        help=f"Comma-separated engines to compare (of {', '.join(ENGINES)}).")
+    parser.add_argument("--seed", type=int, default=SEED, help="Seed for picking the words.")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logging(level="WARNING")
+    engines = args.engines.split(",")
+
+    reference = HangmanAI(data_dir=args.data_dir, engine=engines[0], use_openings=False)
+    words = sorted(reference.airlines_corpus)
+    words = random.Random(args.seed).sample(words, min(args.games, len(words)))
+    states = collect_states(reference, words)
+    print(f"Benchmarking {len(engines)} engines on {len(states)} game states from {len(words)} games.\n")
+
+    print(f"{'engine':<8} {'build s':>8} {'total s':>8} {'mean ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    baseline = None
+    for engine in engines:
+        build_seconds, latencies, guesses = benchmark(engine, states, args.data_dir)
+        total = sum(latencies)
+        p50, p99 = latencies[len(latencies) // 2], latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        print(f"{engine:<8} {build_seconds:>8.2f} {total:>8.2f} {1000 * total / len(latencies):>8.3f} "
+              f"{1000 * p50:>8.3f} {1000 * p99:>8.3f} {1000 * latencies[-1]:>8.3f}")
+        if baseline is None:
+            baseline = guesses
+        elif guesses != baseline:
+            print(f"  warning: {engine} disagrees with {engines[0]} on "
+                  f"{sum(a != b for a, b in zip(guesses, baseline))} states")
+
+    print(f"\n{'corpus':<10} {'list of str MB':>15} {'packed MB':>10} {'trie MB':>10}")
+    for corpus in (reference.airlines_corpus, reference.general_corpus):
+        as_lists, as_packed, as_tries = memory_report(corpus)
+        print(f"{corpus.name:<10} {as_lists / 2 ** 20:>15.1f} {as_packed / 2 ** 20:>10.1f} {as_tries / 2 ** 20:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import json
+import logging
+import os
+
+import corpus_store
+from corpus_index import (AIRLINES_CORPUS_FILE, GENERAL_CORPUS_FILE, corpora_fingerprint, file_fingerprint,
+                          shape_to_state, state_key)
+from filter_engines import letters_only
+from hangman_ai import HangmanAI
+from letter_model import LETTER_MODEL_FILE, LetterModel
+from scorers import SCORERS
+from structured_logging import configure_logging
+
+logger = logging.getLogger("build_artifacts")
+
+# --- Configuration ---
+DATA_DIR = "data"
+OPENINGS_FILE = "openings.json"
+
+# A first-guess outcome is only worth a table entry if at least this many corpus
+# entries lead to it.
+MIN_OUTCOME_SUPPORT = 1
+
+
+def build_binary_corpora(data_dir):
+    """Writes the memory-mappable binary version (.bin) of each text corpus in `data_dir`."""
+    for file_name in (AIRLINES_CORPUS_FILE, GENERAL_CORPUS_FILE):
+        text_path = os.path.join(data_dir, file_name)
+        if not os.path.exists(text_path):
+            logger.warning("Corpus file not found at '%s'. Skipping.", text_path, extra={"path": text_path})
+            continue
+        with open(text_path, 'r', encoding='utf-8') as f:
+            words = [line.strip() for line in f if line.strip()]
+        output_path = corpus_store.binary_path(text_path)
+        corpus_store.write_binary_corpus(words, output_path, file_fingerprint(text_path))
+        logger.info("Binary corpus with %d entries saved to '%s'.", len(words), output_path,
+                    extra={"path": output_path, "entries": len(words)})
+
+
+def build_letter_model(data_dir):
+    """Trains the fallback letter model on the text corpora in `data_dir` and saves it."""
+    entries = []
+    for file_name in (AIRLINES_CORPUS_FILE, GENERAL_CORPUS_FILE):
+        text_path = os.path.join(data_dir, file_name)
+        if os.path.exists(text_path):
+            with open(text_path, 'r', encoding='utf-8') as f:
+                entries.extend(line.strip() for line in f if line.strip())
+    output_path = os.path.join(data_dir, LETTER_MODEL_FILE)
+    LetterModel.train(entries).save(output_path, corpora_fingerprint(data_dir))
+    logger.info("Letter model trained on %d entries saved to '%s'.", len(entries), output_path,
+                extra={"path": output_path, "entries": len(entries)})
+
+
+def build_openings(ai, min_support=MIN_OUTCOME_SUPPORT):
+    """
+    Computes the opening moves for every word shape found in either corpus: the best
+    first guess on an empty mask, and the best second guess after each outcome of that
+    first guess (the letter revealed at some positions, or a miss).
+
+    Returns a dict mapping canonical state keys (see corpus_index.state_key) to guesses.
+    """
+    shapes = set(ai.airlines_corpus.buckets) | set(ai.general_corpus.buckets)
+    logger.info("Computing opening moves for %d word shapes...", len(shapes))
+
+    openings = {}
+    for shape in sorted(shapes):
+        empty_state = shape_to_state(shape)
+        first_guess = ai.make_guess(empty_state, [])
+        openings[state_key(empty_state, [])] = first_guess
+
+        # Every reveal pattern of the first guess that some corpus entry would produce.
+        outcomes = {}
+        for corpus in (ai.airlines_corpus, ai.general_corpus):
+            for word in corpus.bucket(shape):
+                pattern = "".join(char if char == first_guess else '_' for char in letters_only(word))
+                outcomes[pattern] = outcomes.get(pattern, 0) + 1
+
+        for pattern, support in outcomes.items():
+            if support < min_support:
+                continue
+            state = shape_to_state(shape, pattern)
+            openings[state_key(state, [first_guess])] = ai.make_guess(state, [first_guess])
+
+    logger.info("Computed %d opening moves.", len(openings), extra={"entries": len(openings)})
+    return openings
+
+
+def write_openings(openings, fingerprint, strategy, output_path):
+    """
+    Saves the opening table together with the fingerprint of the corpora and the
+    strategy it was built for.
+    """
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({"fingerprint": fingerprint, "strategy": strategy, "openings": openings}, f, sort_keys=True)
+    logger.info("Opening table saved to '%s'.", output_path, extra={"path": output_path})
+
+
+def build_all(data_dir=DATA_DIR, min_support=MIN_OUTCOME_SUPPORT, strategy="frequency", openings=True):
+    """
+    Builds every artifact the solver loads from `data_dir`: the binary corpora, the
+    fallback letter model and the opening table.
+    """
+    build_binary_corpora(data_dir)
+    build_letter_model(data_dir)
+    if not openings:
+        return
+
+    # The table must describe what the solver computes on its own, so build it without one.
+    ai = HangmanAI(data_dir=data_dir, use_openings=False, strategy=strategy)
+    table = build_openings(ai, min_support=min_support)
+    write_openings(table, corpora_fingerprint(data_dir), strategy, os.path.join(data_dir, OPENINGS_FILE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Builds the offline artifacts the Hangman Algo loads at startup.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Directory with the corpus files.")
+    parser.add_argument("--min-support", type=int, default=MIN_OUTCOME_SUPPORT,
+                        help="Minimum number of corpus entries behind a first-guess outcome.")
+    parser.add_argument("--strategy", default="frequency", choices=sorted(SCORERS),
+                        help="Letter scoring strategy the opening table is computed for.")
+    args = parser.parse_args()
+    configure_logging()
+
+    build_all(args.data_dir, min_support=args.min_support, strategy=args.strategy)
+
+
+if __name__ == "__main__":
+    main()
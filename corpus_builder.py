@@ -1,7 +1,18 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
 import requests
 from bs4 import BeautifulSoup
 import re
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlsplit
+from structured_logging import configure_logging
+
+logger = logging.getLogger("corpus_builder")
 
 # A comprehensive list of URLs for the Airlines domain.
 URLS = [
@@ -67,64 +78,238 @@ URLS = [
 
 OUTPUT_FILE = "airlines_corpus.txt"
 
-def scrape_and_clean():
+# Fetched pages, their validators (ETag / Last-Modified) and the terms parsed from them.
+CACHE_DIR = "page_cache"
+# Pages fetched at the same time (requests to one host are still spaced out by HOST_DELAY).
+FETCH_WORKERS = 8
+# Minimum number of seconds between two requests to the same host.
+HOST_DELAY = 1.0
+# Processes that parse HTML (None: one per CPU).
+PARSE_WORKERS = None
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+def extract_terms(html):
+    """
+    Extracts the Hangman-ready words/phrases from a page by targeting specific HTML
+    tags. Runs in the parser processes, so it only takes and returns plain data.
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    terms = set()
+
+    for tag in soup.find_all(['p', 'li', 'th', 'td', 'h1', 'h2', 'h3']):
+        text_content = tag.get_text().lower()
+
+        # Remove text in brackets (like [1], [edit], etc.)
+        text_content = re.sub(r'\[.*?\]', '', text_content)
+
+        # Find all valid Hangman words/phrases in the tag's text
+        words = re.findall(r'\b[a-z\s]{2,}\b', text_content)
+
+        for word in words:
+            # Normalize whitespace and strip leading/trailing spaces
+            cleaned_word = re.sub(r'\s+', ' ', word).strip()
+            if cleaned_word:
+                terms.add(cleaned_word)
+    return sorted(terms)
+
+
+class PageCache:
+    """
+    An on-disk cache of fetched pages. Per URL it keeps the body, the validators the
+    server sent (ETag, Last-Modified) for conditional requests, and the terms parsed
+    from the body, tagged with the body's hash so they are only reused for that body.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, url, suffix):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode('utf-8')).hexdigest()[:32] + suffix)
+
+    def load(self, url):
+        """Returns (body, metadata) for a cached URL, or (None, {}) if it is not cached."""
+        try:
+            with open(self._path(url, ".json"), 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            with open(self._path(url, ".html"), 'rb') as f:
+                return f.read(), metadata
+        except (OSError, ValueError):
+            return None, {}
+
+    def store(self, url, body, headers):
+        """Saves a freshly downloaded page with its validators."""
+        metadata = {
+            "url": url,
+            "etag": headers.get('ETag'),
+            "last_modified": headers.get('Last-Modified'),
+            "sha256": hashlib.sha256(body).hexdigest(),
+            "fetched_at": time.time(),
+        }
+        _write_atomically(self._path(url, ".html"), body)
+        _write_atomically(self._path(url, ".json"), json.dumps(metadata).encode('utf-8'))
+        return metadata
+
+    def load_terms(self, url, body_hash):
+        """Returns the terms parsed from the cached body with hash `body_hash`, or None."""
+        try:
+            with open(self._path(url, ".terms.json"), 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return cached["terms"] if cached.get("sha256") == body_hash else None
+
+    def store_terms(self, url, body_hash, terms):
+        _write_atomically(self._path(url, ".terms.json"),
+                          json.dumps({"sha256": body_hash, "terms": terms}).encode('utf-8'))
+
+
+def _write_atomically(path, data):
+    # Concurrent runs, or a crash mid-write, must never leave a truncated cache file.
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+class HostThrottle:
+    """Spaces out requests to each host by at least `delay` seconds, across all fetch threads."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def fetch_page(session, url, cache, throttle):
+    """
+    Returns (body, metadata, status) for a URL, where status is "fetched", "not modified"
+    or "cached" (a download failed and the cached copy is used). The request carries the
+    cached validators, so an unchanged page costs a 304 and no download. Returns a None
+    body if the page could not be fetched and is not cached.
+    """
+    cached_body, metadata = cache.load(url)
+    headers = dict(HEADERS)
+    if cached_body is not None:
+        if metadata.get("etag"):
+            headers['If-None-Match'] = metadata["etag"]
+        if metadata.get("last_modified"):
+            headers['If-Modified-Since'] = metadata["last_modified"]
+
+    throttle.wait(url)
+    try:
+        response = session.get(url, headers=headers, timeout=15)
+        if response.status_code == 304 and cached_body is not None:
+            return cached_body, metadata, "not modified"
+        response.raise_for_status()
+        return response.content, cache.store(url, response.content, response.headers), "fetched"
+    except requests.exceptions.RequestException as e:
+        if cached_body is not None:
+            logger.warning("Error scraping %s: %s. Using the cached copy.", url, e, extra={"url": url})
+            return cached_body, metadata, "cached"
+        logger.error("Error scraping %s: %s", url, e, extra={"url": url})
+        return None, {}, "failed"
+
+
+def scrape_and_clean(urls=URLS, output_file=OUTPUT_FILE, cache_dir=CACHE_DIR, offline=False,
+                     fetch_workers=FETCH_WORKERS, host_delay=HOST_DELAY, parse_workers=PARSE_WORKERS):
     """
     Scrapes URLs, extracts relevant text by targeting specific HTML tags,
     cleans it to be Hangman-ready, and saves the unique words/phrases to a file.
+
+    Pages are fetched concurrently (but politely, per host) into an on-disk cache and
+    only re-downloaded when the server reports a change. Only new or changed pages are
+    parsed, in a process pool; the terms of unchanged pages come from the cache. With
+    `offline`, nothing is fetched and the corpus is rebuilt from the cached pages.
     """
-    print("Starting corpus generation with scraping...")
-    
+    logger.info("Starting corpus generation %s...", "from cached pages" if offline else "with scraping")
+    cache = PageCache(cache_dir)
     corpus = set()
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    counts = {"fetched": 0, "not modified": 0, "cached": 0, "failed": 0, "parsed": 0}
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as parsers:
+        parsing = {}
+
+        def collect(url, body, metadata):
+            terms = cache.load_terms(url, metadata["sha256"])
+            if terms is not None:
+                corpus.update(terms)
+            else:
+                parsing[parsers.submit(extract_terms, body)] = (url, metadata["sha256"])
+
+        if offline:
+            for url in urls:
+                body, metadata = cache.load(url)
+                if body is None:
+                    logger.warning("No cached copy of %s. Skipping.", url, extra={"url": url})
+                    counts["failed"] += 1
+                    continue
+                counts["cached"] += 1
+                collect(url, body, metadata)
+        else:
+            throttle = HostThrottle(host_delay)
+            with requests.Session() as session, ThreadPoolExecutor(max_workers=fetch_workers) as fetchers:
+                # Each page is handed to the parsers as soon as it arrives, so fetching and parsing overlap.
+                fetches = [(url, fetchers.submit(fetch_page, session, url, cache, throttle)) for url in urls]
+                for url, fetch in fetches:
+                    body, metadata, status = fetch.result()
+                    counts[status] += 1
+                    logger.info("Scraped: %s (%s)", url, status, extra={"url": url, "status": status})
+                    if body is not None:
+                        collect(url, body, metadata)
+
+        for future, (url, body_hash) in parsing.items():
+            try:
+                terms = future.result()
+            except Exception:
+                logger.exception("An unexpected error occurred for %s.", url, extra={"url": url})
+                continue
+            counts["parsed"] += 1
+            cache.store_terms(url, body_hash, terms)
+            corpus.update(terms)
+
+    logger.info("Found %d unique words/phrases.", len(corpus), extra={"entries": len(corpus), **counts})
 
-    for url in URLS:
-        try:
-            print(f"Scraping: {url}")
-            time.sleep(1) 
-            
-            response = requests.get(url, headers=headers, timeout=15)
-            response.raise_for_status()
-
-            soup = BeautifulSoup(response.content, 'html.parser')
-
-            # Scraping Logic
-            
-            for tag in soup.find_all(['p', 'li', 'th', 'td', 'h1', 'h2', 'h3']):
-                text_content = tag.get_text().lower()
-                
-                # Remove text in brackets (like [1], [edit], etc.)
-                text_content = re.sub(r'\[.*?\]', '', text_content)
-
-                # Find all valid Hangman words/phrases in the tag's text
-                words = re.findall(r'\b[a-z\s]{2,}\b', text_content)
-                
-                for word in words:
-                    # Normalize whitespace and strip leading/trailing spaces
-                    cleaned_word = re.sub(r'\s+', ' ', word).strip()
-                    if cleaned_word:
-                        corpus.add(cleaned_word)
-
-        except requests.exceptions.RequestException as e:
-            print(f"Error scraping {url}: {e}")
-        except Exception as e:
-            print(f"An unexpected error occurred for {url}: {e}")
-
-    print(f"\nFound {len(corpus)} unique words/phrases.")
-    
     sorted_corpus = sorted(list(corpus))
-    
+
     try:
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+        with open(output_file, 'w', encoding='utf-8') as f:
             for word in sorted_corpus:
                 f.write(f"{word}\n")
-        print(f"Corpus successfully saved to {OUTPUT_FILE}")
+        logger.info("Corpus successfully saved to %s", output_file, extra={"path": output_file})
     except IOError as e:
-        print(f"Error writing to file {OUTPUT_FILE}: {e}")
+        logger.error("Error writing to file %s: %s", output_file, e, extra={"path": output_file})
 
 
-if __name__ == "__main__":
-    scrape_and_clean()
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrapes the airline pages into a raw Hangman corpus.")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="File to write the corpus to.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Directory of the page cache.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Do not fetch anything; rebuild the corpus from the cached pages.")
+    parser.add_argument("--fetch-workers", type=int, default=FETCH_WORKERS, help="Pages fetched at the same time.")
+    parser.add_argument("--host-delay", type=float, default=HOST_DELAY,
+                        help="Minimum seconds between two requests to the same host.")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS,
+                        help="Processes that parse HTML (default: one per CPU).")
+    return parser.parse_args()
 
+
+if __name__ == "__main__":
+    configure_logging()
+    args = parse_args()
+    scrape_and_clean(output_file=args.output, cache_dir=args.cache_dir, offline=args.offline,
+                     fetch_workers=args.fetch_workers, host_delay=args.host_delay, parse_workers=args.parse_workers)
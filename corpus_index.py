@@ -0,0 +1,342 @@
+import hashlib
+import os
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from itertools import islice
+
+# File names of the corpora inside the data directory.
+AIRLINES_CORPUS_FILE = "airlines_corpus.txt"
+GENERAL_CORPUS_FILE = "general_corpus.txt"
+
+
+def word_shape(entry):
+    """
+    Returns the shape of a corpus entry: a tuple with the length of each of its words.
+    The shape fixes the total number of letters and the word count, so two entries
+    can only ever match the same mask if they share a shape.
+    """
+    return tuple(len(word) for word in entry.split())
+
+
+def split_word_state(current_word_state):
+    """
+    Splits a word state such as "_ a _   _ _" into one pattern per word ("_a_", "__").
+    Letters are separated by single spaces and words by two or more spaces.
+    """
+    word_components = re.split(r'\s{2,}', current_word_state.strip())
+    return [component.replace(' ', '') for component in word_components]
+
+
+def state_shape(current_word_state):
+    """Returns the shape (per-word lengths) of a word state."""
+    return tuple(len(part) for part in split_word_state(current_word_state))
+
+
+def shape_to_state(shape, letters=None):
+    """
+    Builds the word state a client would send for a word of the given shape, e.g.
+    (3, 2) -> "_ _ _   _ _". `letters` optionally fills in positions (spaces removed),
+    with '_' for the blanks.
+    """
+    letters = iter(letters or '_' * sum(shape))
+    return "   ".join(" ".join(next(letters) for _ in range(length)) for length in shape)
+
+
+def state_key(current_word_state, guessed_letters):
+    """
+    Returns a canonical key for a game state: the per-word patterns and the sorted set
+    of guessed letters, e.g. "_a_ __|ae". Two requests with the same key always get
+    the same guess, whatever spacing or guess order the client used.
+    """
+    return " ".join(split_word_state(current_word_state)) + "|" + "".join(sorted(set(guessed_letters)))
+
+
+def file_fingerprint(path):
+    """Returns the SHA-256 of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def corpora_fingerprint(data_dir):
+    """
+    Returns a hash of the corpus files in `data_dir`. Artifacts derived from the corpora
+    store it, so a stale artifact can be detected and ignored after the corpora change.
+    """
+    digest = hashlib.sha256()
+    for file_name in (AIRLINES_CORPUS_FILE, GENERAL_CORPUS_FILE):
+        path = os.path.join(data_dir, file_name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class PackedBucket:
+    """
+    A read-only sequence of the entries of one shape bucket, packed into one contiguous
+    buffer, with the end of each entry in an array of offsets. Two objects hold the
+    whole bucket instead of one str object per entry, which takes about a fifth of the
+    memory.
+
+    The buffer is a str: the corpora are ASCII, which CPython stores at one byte per
+    character, so it is as compact as bytes, and an entry is a single slice with no
+    decoding.
+    """
+
+    __slots__ = ("_buffer", "_offsets")
+
+    shared = False
+
+    def __init__(self, entries=None):
+        """Packs `entries` at once, or, without them, starts a bucket to fill with append() and freeze()."""
+        self._buffer = bytearray()
+        self._offsets = array('I', [0])
+        if entries is not None:
+            for entry in entries:
+                self.append(entry)
+            self.freeze()
+
+    def append(self, entry):
+        """Adds an entry while the bucket is being built, before freeze()."""
+        self._buffer += entry.encode("utf-8")
+        self._offsets.append(self._offsets[-1] + len(entry))
+
+    def freeze(self):
+        """Ends the building: the buffer becomes an immutable str of the exact size."""
+        self._buffer = self._buffer.decode("utf-8")
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, word_id):
+        if word_id < 0:
+            raise IndexError("bucket index out of range")
+        # The offsets array raises the IndexError for ids past the end.
+        offsets = self._offsets
+        return self._buffer[offsets[word_id]:offsets[word_id + 1]]
+
+    def __iter__(self):
+        buffer = self._buffer
+        for start, end in zip(self._offsets, islice(self._offsets, 1, None)):
+            yield buffer[start:end]
+
+    def nbytes(self):
+        """Returns the bytes held by the bucket: the buffer, the offsets and the bucket itself."""
+        return sys.getsizeof(self._buffer) + sys.getsizeof(self._offsets) + sys.getsizeof(self)
+
+
+def structure_nbytes(value, seen=None):
+    """
+    Returns the bytes held by a structure that an engine derived from a bucket, following
+    containers (dicts, lists, tuples, sets) into their items and counting every object
+    once. Objects that know their own size (NumPy arrays, tries) report it via `nbytes`.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return nbytes() if callable(nbytes) else nbytes
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(structure_nbytes(key, seen) + structure_nbytes(item, seen) for key, item in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(structure_nbytes(item, seen) for item in value)
+    return size
+
+
+def bucket_nbytes(bucket):
+    """Returns the bytes held by a bucket of any kind (packed, memory-mapped or a list of str)."""
+    if hasattr(bucket, "nbytes"):
+        return bucket.nbytes()
+    return sys.getsizeof(bucket) + sum(sys.getsizeof(entry) for entry in bucket)
+
+
+class CorpusIndex:
+    """
+    A corpus partitioned by word shape.
+
+    The index is built once when the corpus is loaded, so a guess only has to look
+    at the entries that have the same total length, word count and per-word lengths
+    as the masked word instead of scanning the whole corpus. Each bucket is stored as
+    a PackedBucket unless `packed` is false.
+    """
+
+    def __init__(self, words, name=None, packed=True):
+        buckets = {}
+        # Packed buckets are filled one entry at a time, so `words` may be a stream that
+        # is never held in memory as a whole.
+        for word in words:
+            bucket = buckets.get(word_shape(word))
+            if bucket is None:
+                bucket = buckets[word_shape(word)] = PackedBucket() if packed else []
+            bucket.append(word)
+        if packed:
+            for bucket in buckets.values():
+                bucket.freeze()
+        self._init_buckets(buckets, name)
+
+    @classmethod
+    def from_buckets(cls, buckets, name=None):
+        """
+        Creates an index from entries that are already partitioned by shape, e.g. the
+        memory-mapped buckets of a binary corpus (see corpus_store.py). Each bucket may be
+        any sequence of entries.
+        """
+        index = cls.__new__(cls)
+        index._init_buckets(buckets, name)
+        return index
+
+    def _init_buckets(self, buckets, name):
+        self.name = name
+        self.buckets = buckets
+        self._size = sum(len(bucket) for bucket in buckets.values())
+
+        # Per-bucket structures that filtering engines derive lazily from the words, and
+        # their total size by kind, measured once when each is built (see memory_report).
+        self._derived = {}
+        self._derived_lock = threading.Lock()
+        self._index_bytes = {}
+        self._bucket_bytes = None
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        for bucket in self.buckets.values():
+            yield from bucket
+
+    def bucket(self, shape):
+        """Returns the entries with the given shape (an empty list if there are none)."""
+        return self.buckets.get(shape, [])
+
+    def derived(self, key, builder):
+        """
+        Returns the structure stored under `key`, building it with `builder()` the first
+        time it is requested. Engines use this to attach per-bucket data to the index,
+        so the data is built at most once and is dropped together with the index.
+        """
+        value = self._derived.get(key)
+        if value is None:
+            with self._derived_lock:
+                value = self._derived.get(key)
+                if value is None:
+                    value = builder()
+                    self._index_bytes[key[0]] = self._index_bytes.get(key[0], 0) + structure_nbytes(value)
+                    self._derived[key] = value
+        return value
+
+    def derived_shapes(self):
+        """Returns the shapes of the buckets that have derived structures built."""
+        return {key[1] for key in list(self._derived)}
+
+    def memory_report(self):
+        """
+        Returns the memory held by the index, in bytes:
+
+        entries        number of entries
+        entry_bytes    the buckets held in this process's own memory
+        mapped_bytes   the buckets mapped from a binary corpus file, which are shared
+                       through the page cache by every process that maps the file
+        index_bytes    the structures derived by the engines, by kind (e.g. "bitmap",
+                       "letter_masks"), summed over the buckets
+
+        Buckets never change after loading and derived structures are sized as they are
+        built, so after the first call this only reads stored totals (it is called on
+        every metrics scrape).
+        """
+        if self._bucket_bytes is None:
+            entry_bytes = mapped_bytes = 0
+            for bucket in self.buckets.values():
+                if getattr(bucket, "shared", False):
+                    mapped_bytes += bucket_nbytes(bucket)
+                else:
+                    entry_bytes += bucket_nbytes(bucket)
+            self._bucket_bytes = entry_bytes, mapped_bytes
+
+        entry_bytes, mapped_bytes = self._bucket_bytes
+        with self._derived_lock:
+            index_bytes = dict(self._index_bytes)
+        return {"entries": self._size, "entry_bytes": entry_bytes, "mapped_bytes": mapped_bytes,
+                "index_bytes": index_bytes}
+
+
+def occurrence_prior(entries):
+    """
+    Returns a prior for WeightedCorpusIndex from the words of `entries`: an entry with
+    n occurrences of its words there is weighted by 1 + floor(log2(1 + n)), i.e. 1 for
+    unseen words, 2 for one or two occurrences, 3 for three to six, and so on.
+    """
+    occurrences = {}
+    for entry in entries:
+        for word in entry.split():
+            occurrences[word] = occurrences.get(word, 0) + 1
+
+    def prior(entry):
+        return (1 + sum(occurrences.get(word, 0) for word in entry.split())).bit_length()
+    return prior
+
+
+class WeightedCorpusIndex(CorpusIndex):
+    """
+    One index over several corpora, in which every entry carries a weight: the sum of
+    the weights of the sources it appears in, times an optional prior. A single
+    filtering pass over it finds the candidates of every source at once, and the
+    scorers count each candidate as many times as its weight.
+
+    Each bucket is ordered by descending weight (entries of equal weight keep their
+    corpus order), so the entries of one weight form a contiguous range of word ids and
+    candidates are grouped by weight with a binary search per range.
+    """
+
+    def __init__(self, sources, name=None, prior=None):
+        """
+        `sources` holds (entries, weight) pairs. `prior` optionally maps an entry to a
+        whole-number multiplier of its weight. Weights are kept as integers, so every
+        engine scores the same candidates to exactly the same totals.
+        """
+        entry_weights = {}
+        for entries, weight in sources:
+            for entry in entries:
+                entry_weights[entry] = entry_weights.get(entry, 0) + weight
+        if prior is not None:
+            entry_weights = {entry: weight * prior(entry) for entry, weight in entry_weights.items()}
+
+        buckets = {}
+        for entry in sorted(entry_weights, key=entry_weights.__getitem__, reverse=True):
+            buckets.setdefault(word_shape(entry), []).append(entry)
+
+        # Per bucket, the (weight, first id, end id) ranges of its entries.
+        self._weight_ranges = {}
+        for shape, bucket in buckets.items():
+            ranges = self._weight_ranges[shape] = []
+            for word_id, entry in enumerate(bucket):
+                weight = entry_weights[entry]
+                if ranges and ranges[-1][0] == weight:
+                    ranges[-1][2] = word_id + 1
+                else:
+                    ranges.append([weight, word_id, word_id + 1])
+        self._init_buckets({shape: PackedBucket(bucket) for shape, bucket in buckets.items()}, name)
+
+    def weight_ranges(self, shape):
+        """Returns the (weight, first id, end id) ranges of the shape bucket, by descending weight."""
+        return self._weight_ranges.get(shape, [])
+
+    def group_by_weight(self, shape, candidate_ids):
+        """Returns {weight: ascending candidate ids} for candidates of the shape bucket."""
+        ids = sorted(candidate_ids)
+        groups = {}
+        for weight, start, end in self.weight_ranges(shape):
+            group = ids[bisect_left(ids, start):bisect_left(ids, end)]
+            if group:
+                groups[weight] = group
+        return groups
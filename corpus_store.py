@@ -0,0 +1,134 @@
+"""
+Compact binary corpus format, loaded with mmap.
+
+A .bin corpus holds the entries of a text corpus grouped by shape (per-word lengths)
+as fixed-width, NUL-padded ASCII records, so the loader never parses text: it maps
+the file and hands out lightweight views of each bucket. Because the mapping is
+read-only and backed by the page cache, every worker process on a host shares the
+same physical pages.
+
+Layout (little-endian):
+    header     magic b"HGMC", version (u32), bucket count (u32), source hash (32 bytes)
+    directory  per bucket: entry count (u32), record width (u16), number of words (u16),
+               data offset (u64), then one u16 per word length
+    data       per bucket: entry count * record width bytes
+"""
+import mmap
+import os
+import struct
+
+from corpus_index import CorpusIndex, file_fingerprint, word_shape
+
+MAGIC = b"HGMC"
+VERSION = 1
+
+_HEADER = struct.Struct("<4sII32s")
+_BUCKET = struct.Struct("<IHHQ")
+
+
+class MappedBucket:
+    """A read-only sequence view of one bucket's fixed-width records."""
+
+    __slots__ = ("_buffer", "_offset", "_count", "_width")
+
+    # The records live in the page cache, shared by every process that maps the file.
+    shared = True
+
+    def __init__(self, buffer, offset, count, width):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+        self._width = width
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, word_id):
+        if not 0 <= word_id < self._count:
+            raise IndexError("bucket index out of range")
+        start = self._offset + word_id * self._width
+        return self._buffer[start:start + self._width].rstrip(b"\0").decode("ascii")
+
+    def __iter__(self):
+        for word_id in range(self._count):
+            yield self[word_id]
+
+    def nbytes(self):
+        """Returns the size of the bucket's records in the mapped file."""
+        return self._count * self._width
+
+
+def write_binary_corpus(words, output_path, source_hash):
+    """
+    Writes `words` in the binary format. Entries keep their corpus order inside each
+    bucket, so word ids match those of an index built from the text file.
+    """
+    buckets = {}
+    for word in words:
+        buckets.setdefault(word_shape(word), []).append(word.encode("ascii"))
+
+    directory_size = sum(_BUCKET.size + 2 * len(shape) for shape in buckets)
+    offset = _HEADER.size + directory_size
+
+    directory = []
+    data = []
+    for shape, entries in buckets.items():
+        width = max(len(entry) for entry in entries)
+        directory.append(_BUCKET.pack(len(entries), width, len(shape), offset))
+        directory.append(struct.pack(f"<{len(shape)}H", *shape))
+        data.append(b"".join(entry.ljust(width, b"\0") for entry in entries))
+        offset += len(entries) * width
+
+    temp_path = output_path + ".tmp"
+    with open(temp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, VERSION, len(buckets), bytes.fromhex(source_hash)))
+        f.writelines(directory)
+        f.writelines(data)
+    os.replace(temp_path, output_path)
+
+
+def read_source_hash(path):
+    """Returns the hash of the text corpus a .bin file was built from, or None if it is not a valid file."""
+    with open(path, "rb") as f:
+        header = f.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        return None
+    magic, version, _, source_hash = _HEADER.unpack(header)
+    if magic != MAGIC or version != VERSION:
+        return None
+    return source_hash.hex()
+
+
+def load_binary_corpus(path, name=None):
+    """Memory-maps a .bin corpus and returns a CorpusIndex over it."""
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, bucket_count, _ = _HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"'{path}' is not a version {VERSION} binary corpus")
+
+    buckets = {}
+    position = _HEADER.size
+    for _ in range(bucket_count):
+        count, width, word_count, offset = _BUCKET.unpack_from(buffer, position)
+        position += _BUCKET.size
+        shape = struct.unpack_from(f"<{word_count}H", buffer, position)
+        position += 2 * word_count
+        buckets[shape] = MappedBucket(buffer, offset, count, width)
+    return CorpusIndex.from_buckets(buckets, name=name)
+
+
+def binary_path(text_path):
+    """Returns where the binary version of a text corpus lives (next to it, with a .bin suffix)."""
+    return os.path.splitext(text_path)[0] + ".bin"
+
+
+def is_fresh(text_path):
+    """Checks whether the binary version of `text_path` exists and was built from its current contents."""
+    path = binary_path(text_path)
+    if not os.path.exists(path):
+        return False
+    if not os.path.exists(text_path):
+        return True  # Only the binary corpus was shipped.
+    return read_source_hash(path) == file_fingerprint(text_path)
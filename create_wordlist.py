@@ -1,74 +1,177 @@
+import argparse
+import json
+import logging
 import re
 import os
-from PyPDF2 import PdfReader
+from concurrent.futures import ProcessPoolExecutor
+from corpus_index import file_fingerprint
+from refine_corpus import write_atomically
+from structured_logging import configure_logging
 
-def create_word_list_from_pdf(pdf_path):
+logger = logging.getLogger("create_wordlist")
+
+# --- Configuration ---
+PDF_FILE = "aviationdictionary (1).pdf"
+# Pages holding the dictionary entries (1-based, inclusive).
+FIRST_PAGE = 3
+LAST_PAGE = 353
+# Where the terms are written; refine_corpus.py merges this file into the airline corpus.
+OUTPUT_FILE = os.path.join("data", "airlines.txt")
+# Extracted page text, per PDF hash, so re-runs do not parse the PDF again.
+CACHE_DIR = "pdf_cache"
+# Pages extracted by one task in the process pool.
+PAGES_PER_TASK = 16
+
+
+def extract_page_range(pdf_path, start, end):
+    """Returns the text of pages start..end-1 (0-based). Runs in the pool, where each task opens the PDF itself."""
+    from PyPDF2 import PdfReader
+    with open(pdf_path, 'rb') as pdf_file:
+        reader = PdfReader(pdf_file)
+        return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def count_pages(pdf_path):
+    from PyPDF2 import PdfReader
+    with open(pdf_path, 'rb') as pdf_file:
+        return len(PdfReader(pdf_file).pages)
+
+
+class PageTextCache:
+    """
+    The text extracted from each page of one PDF, stored as JSON under the hash of the
+    PDF's contents, so a changed PDF never reuses the text of an older version.
     """
-    Reads a PDF, extracts aviation terms (text before " — ") from pages 3-353,
+
+    def __init__(self, cache_dir, pdf_hash):
+        self.path = os.path.join(cache_dir, f"{pdf_hash}.json")
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            cached = {}
+        self.page_count = cached.get("page_count")
+        self.pages = {int(index): text for index, text in cached.get("pages", {}).items()}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        write_atomically([json.dumps({"page_count": self.page_count, "pages": self.pages})], self.path)
+
+
+def extract_pages(pdf_path, first_page=FIRST_PAGE, last_page=LAST_PAGE, cache_dir=CACHE_DIR, workers=None):
+    """
+    Returns the text of pages first_page..last_page (1-based, inclusive, clamped to the
+    PDF's length). Pages already in the cache are not parsed again; the others are
+    extracted in page ranges over a process pool and added to the cache.
+    """
+    cache = PageTextCache(cache_dir, file_fingerprint(pdf_path))
+    if cache.page_count is None:
+        cache.page_count = count_pages(pdf_path)
+
+    # Adjust for 0-based indexing
+    start_page, end_page = first_page - 1, min(last_page, cache.page_count)
+    logger.info("PDF has %d pages. Extracting from pages %d to %d...", cache.page_count, first_page, end_page)
+
+    missing = [i for i in range(start_page, end_page) if i not in cache.pages]
+    if missing:
+        # Contiguous runs of missing pages, cut into tasks of PAGES_PER_TASK pages.
+        tasks, run_start = [], missing[0]
+        for previous, current in zip(missing, missing[1:] + [None]):
+            if current != previous + 1 or previous + 1 - run_start == PAGES_PER_TASK:
+                tasks.append((run_start, previous + 1))
+                run_start = current
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(start, pool.submit(extract_page_range, pdf_path, start, end)) for start, end in tasks]
+            for start, future in futures:
+                for offset, text in enumerate(future.result()):
+                    cache.pages[start + offset] = text
+        logger.info("Extracted %d pages (%d were cached).", len(missing), end_page - start_page - len(missing))
+    else:
+        logger.info("All %d pages were cached. Skipping PDF parsing.", end_page - start_page)
+    cache.save()
+    return [cache.pages[i] for i in range(start_page, end_page)]
+
+
+def extract_terms(page_texts):
+    """Extracts the aviation terms (text before " — ") from page texts, cleaned and uppercased."""
+    found_words = set()
+    for page_text in page_texts:
+        lines = page_text.splitlines()
+
+        for line in lines:
+            line = line.strip()
+            # Only consider lines with space-dash-space (definition separator)
+            if not line or " — " not in line:
+                continue
+
+            # Split at " — " and take the left part (the term)
+            term = line.split(" — ", 1)[0].strip()
+
+            # Clean: keep letters, numbers, and spaces
+            cleaned_term = re.sub(r'[^A-Za-z0-9 ]+', '', term).strip()
+
+            # Uppercase for consistency
+            cleaned_term = cleaned_term.upper()
+
+            # Add only meaningful terms
+            if len(cleaned_term) >= 3 and not cleaned_term.isdigit():
+                found_words.add(cleaned_term)
+    return found_words
+
+
+def create_word_list_from_pdf(pdf_path, first_page=FIRST_PAGE, last_page=LAST_PAGE, output_path=OUTPUT_FILE,
+                              cache_dir=CACHE_DIR, workers=None):
+    """
+    Reads a PDF, extracts aviation terms (text before " — ") from the given pages,
     cleans them, and saves them to a file.
     """
     try:
-        with open(pdf_path, 'rb') as pdf_file:
-            reader = PdfReader(pdf_file)
-            total_pages = len(reader.pages)
-            print(f"PDF has {total_pages} pages. Extracting from pages 3 to 353...")
-            
-            # Adjust for 0-based indexing
-            start_page, end_page = 2, 352  
-            if end_page >= total_pages:
-                end_page = total_pages - 1
-
-            found_words = set()
-
-            for i in range(start_page, end_page + 1):
-                page_text = reader.pages[i].extract_text() or ""
-                lines = page_text.splitlines()
-
-                for line in lines:
-                    line = line.strip()
-                    # Only consider lines with space-dash-space (definition separator)
-                    if not line or " — " not in line:
-                        continue
-                    
-                    # Split at " — " and take the left part (the term)
-                    term = line.split(" — ", 1)[0].strip()
-
-                    # Clean: keep letters, numbers, and spaces
-                    cleaned_term = re.sub(r'[^A-Za-z0-9 ]+', '', term).strip()
-
-                    # Uppercase for consistency
-                    cleaned_term = cleaned_term.upper()
-
-                    # Add only meaningful terms
-                    if len(cleaned_term) >= 3 and not cleaned_term.isdigit():
-                        found_words.add(cleaned_term)
+        page_texts = extract_pages(pdf_path, first_page, last_page, cache_dir=cache_dir, workers=workers)
 
         # Sort and save
-        sorted_words = sorted(found_words)
-        os.makedirs('data', exist_ok=True)
-        output_path = os.path.join('data', 'airlines.txt')
-        with open(output_path, 'w', encoding='utf-8') as f:
-            for word in sorted_words:
-                f.write(word + '\n')
+        sorted_words = sorted(extract_terms(page_texts))
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        write_atomically(sorted_words, output_path)
 
-        print(f"\nSuccessfully created word list with {len(sorted_words)} unique terms.")
-        print(f"File saved to: {output_path}")
+        logger.info("Successfully created word list with %d unique terms. File saved to: %s",
+                    len(sorted_words), output_path, extra={"path": output_path, "entries": len(sorted_words)})
 
         return sorted_words
 
     except FileNotFoundError:
-        print(f"Error: The file '{pdf_path}' was not found.")
+        logger.error("The file '%s' was not found.", pdf_path, extra={"path": pdf_path})
         return None
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    except Exception:
+        logger.exception("An error occurred while extracting the word list.")
         return None
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Extracts the terms of an aviation dictionary PDF into a word list.")
+    parser.add_argument("pdf", nargs="?", default=PDF_FILE, help="The dictionary PDF.")
+    parser.add_argument("--first-page", type=int, default=FIRST_PAGE, help="First page with entries (1-based).")
+    parser.add_argument("--last-page", type=int, default=LAST_PAGE, help="Last page with entries (1-based, inclusive).")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Word list to write.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="Directory of the extracted page text cache.")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: one per CPU).")
+    parser.add_argument("--refine", action="store_true",
+                        help="Then run the refinement stage with the word list as its additional words, "
+                             "and rebuild the artifacts the server loads.")
+    parser.add_argument("--skip-openings", action="store_true",
+                        help="With --refine, rebuild the binary corpora but not the (slower) opening table.")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    pdf_filename = "aviationdictionary (1).pdf"
-    extracted_words = create_word_list_from_pdf(pdf_filename)
+    configure_logging()
+    args = parse_args()
+    extracted_words = create_word_list_from_pdf(args.pdf, args.first_page, args.last_page, args.output,
+                                                cache_dir=args.cache_dir, workers=args.workers)
 
     if extracted_words:
-        print("\nSample of the first 20 extracted words:")
-        for word in extracted_words[:20]:
-            print(word)
+        logger.info("Sample of the first 20 extracted words: %s", ", ".join(extracted_words[:20]),
+                    extra={"sample": extracted_words[:20]})
+
+    if extracted_words and args.refine:
+        from refine_corpus import refine_and_build
+        refine_and_build(additional_file=args.output, openings=not args.skip_openings)
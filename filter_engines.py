@@ -0,0 +1,824 @@
+import logging
+import re
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only the "numpy" engine needs it.
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# For every byte value, the positions of its set bits (used to decode bitsets into ids).
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def letters_only(entry):
+    """Returns an entry with its spaces removed, i.e. one character per mask position."""
+    return "".join(entry.split())
+
+
+def bitset_to_ids(bits, size):
+    """Decodes a bitset over `size` word ids into the ascending list of ids that are set."""
+    ids = []
+    for byte_index, byte in enumerate(bits.to_bytes((size + 7) // 8, 'little')):
+        if byte:
+            base = byte_index << 3
+            ids.extend(base + bit for bit in _BYTE_BITS[byte])
+    return ids
+
+
+class BitmapCandidates:
+    """
+    The candidates found by the bitmap engine, kept as the bitset they were computed as.
+    The ids are only decoded the first time they are iterated or indexed, so scoring
+    that works on the bitset directly (see BitmapEngine.weighted_letter_counts) never
+    pays for decoding a large candidate set.
+    """
+    __slots__ = ("bits", "size", "_ids")
+
+    def __init__(self, bits, size):
+        self.bits = bits
+        self.size = size
+        self._ids = None
+
+    def ids(self):
+        if self._ids is None:
+            self._ids = array('I', bitset_to_ids(self.bits, self.size))
+        return self._ids
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def __iter__(self):
+        return iter(self.ids())
+
+    def __getitem__(self, index):
+        return self.ids()[index]
+
+
+def letter_bit(letter):
+    """Returns the bit of a lowercase letter in a 26-bit letter mask (0 for anything else)."""
+    return 1 << (ord(letter) - 97) if 'a' <= letter <= 'z' and len(letter) == 1 else 0
+
+
+def letter_mask(text):
+    """Returns the 26-bit mask of the letters that occur in `text`."""
+    mask = 0
+    for letter in set(text):
+        mask |= letter_bit(letter)
+    return mask
+
+
+def bucket_letter_masks(corpus, shape):
+    """Returns the per-word letter masks of a shape bucket, built once and kept on the index."""
+    return corpus.derived(("letter_masks", shape), lambda: array('I', map(letter_mask, corpus.bucket(shape))))
+
+
+class MaskConstraints:
+    """
+    Everything a mask and the guessed letters say about the hidden word: the letters at
+    the revealed positions, the letters that were revealed (so cannot sit in a blank),
+    and the letters that were guessed wrong (so cannot appear at all). Guesses that are
+    not a single lowercase letter say nothing and are ignored.
+    """
+
+    def __init__(self, parts, guessed_letters):
+        self.pattern = "".join(parts)
+        self.revealed_positions = [(position, char) for position, char in enumerate(self.pattern) if char != '_']
+        self.blank_positions = [position for position, char in enumerate(self.pattern) if char == '_']
+        self.revealed_letters = {char for _, char in self.revealed_positions}
+        self.missed_letters = {letter for letter in guessed_letters
+                               if letter_bit(letter) and letter not in self.revealed_letters}
+        self.miss_mask = letter_mask("".join(self.missed_letters))
+
+    def matches(self, letters):
+        """Checks one entry (spaces removed) against the constraints."""
+        return (all(letters[position] == char for position, char in self.revealed_positions)
+                and not any(letters[position] in self.revealed_letters for position in self.blank_positions))
+
+
+def narrow_ids(corpus, shape, within, constraints):
+    """
+    Keeps the ids in `within` whose entries satisfy `constraints` by checking them one
+    by one, so the cost is proportional to the number of surviving ids.
+    """
+    bucket = corpus.bucket(shape)
+    masks = bucket_letter_masks(corpus, shape)
+    miss_mask = constraints.miss_mask
+    return [word_id for word_id in within
+            if not masks[word_id] & miss_mask and constraints.matches(letters_only(bucket[word_id]))]
+
+
+class CandidateEngine:
+    """
+    Base class of the filtering engines. Subclasses implement `candidate_ids`; the
+    letter scoring below can be overridden by engines with a faster representation.
+    """
+    name = None
+
+    def prepare(self, corpus, shape):
+        """Builds the per-bucket structures this engine uses, ahead of the first guess that needs them."""
+        bucket_letter_masks(corpus, shape)
+
+    def session_candidates(self, candidate_ids):
+        """
+        Returns what a game session keeps of the candidates, to be passed back as
+        `within` on the game's next turn: the ids packed into an array, or None when
+        narrowing is no cheaper for this engine than filtering the bucket again.
+        """
+        return array('I', candidate_ids) if candidate_ids is not None else None
+
+    def best_letter(self, corpus, shape, candidate_ids, guessed_letters):
+        """
+        Returns the most common letter over the candidates that has not been guessed yet,
+        or None if there is none. Ties go to the letter that appears first in the
+        candidates, in corpus order.
+        """
+        bucket = corpus.bucket(shape)
+        all_letters_in_candidates = "".join(bucket[i] for i in candidate_ids)
+        letter_counts = Counter(all_letters_in_candidates)
+
+        # Remove letters that have already been guessed.
+        for letter in guessed_letters:
+            if letter in letter_counts:
+                del letter_counts[letter]
+
+        # Also remove spaces from the potential guesses.
+        if ' ' in letter_counts:
+            del letter_counts[' ']
+
+        # If there are any valid letters left, return the most common one.
+        if letter_counts:
+            return letter_counts.most_common(1)[0][0]
+
+        return None
+
+    def letter_presence(self, corpus, shape, candidate_ids):
+        """Returns, for each letter a-z, the number of candidates that contain it."""
+        masks = bucket_letter_masks(corpus, shape)
+        presence = [0] * 26
+        # Many candidates share a letter set, so decode each distinct mask only once.
+        for mask, count in Counter(masks[word_id] for word_id in candidate_ids).items():
+            while mask:
+                lowest = mask & -mask
+                presence[lowest.bit_length() - 1] += count
+                mask ^= lowest
+        return presence
+
+    def partition_sizes(self, corpus, shape, candidate_ids):
+        """
+        Returns, for each letter a-z, the sum of the squared sizes of the groups the
+        candidates would split into if that letter were guessed (one group per set of
+        positions it would be revealed at, plus one for a miss). Divided by the number
+        of candidates, this is the expected number of candidates left after the guess.
+        """
+        bucket = corpus.bucket(shape)
+        groups = [{} for _ in range(26)]
+        for word_id in candidate_ids:
+            signature = {}
+            for position, char in enumerate(letters_only(bucket[word_id])):
+                signature[char] = signature.get(char, 0) | (1 << position)
+            for char, positions in signature.items():
+                code = ord(char) - 97
+                if 0 <= code < 26:
+                    groups[code][positions] = groups[code].get(positions, 0) + 1
+
+        total = len(candidate_ids)
+        sizes = []
+        for letter_groups in groups:
+            misses = total - sum(letter_groups.values())
+            sizes.append(misses * misses + sum(size * size for size in letter_groups.values()))
+        return sizes
+
+    # Weighted scoring, for indexes whose entries carry weights (see WeightedCorpusIndex).
+    # Each candidate counts as many times as its weight. Weights take few distinct values,
+    # so the candidates are grouped by weight and each group is scored in one go.
+
+    def weighted_letter_counts(self, corpus, shape, candidate_ids):
+        """Returns, for each letter a-z, its weighted number of occurrences over the candidates."""
+        bucket = corpus.bucket(shape)
+        counts = [0] * 26
+        for weight, ids in corpus.group_by_weight(shape, candidate_ids).items():
+            for char, count in Counter("".join(bucket[i] for i in ids)).items():
+                code = ord(char) - 97
+                if 0 <= code < 26:
+                    counts[code] += weight * count
+        return counts
+
+    def weighted_letter_presence(self, corpus, shape, candidate_ids):
+        """Returns, for each letter a-z, the total weight of the candidates that contain it."""
+        presence = [0] * 26
+        for weight, ids in corpus.group_by_weight(shape, candidate_ids).items():
+            for code, count in enumerate(self.letter_presence(corpus, shape, ids)):
+                presence[code] += weight * count
+        return presence
+
+    def weighted_partition_sizes(self, corpus, shape, candidate_ids):
+        """Same as partition_sizes, with the size of each group being the total weight of its candidates."""
+        bucket = corpus.bucket(shape)
+        groups = [{} for _ in range(26)]
+        total = 0
+        for weight, ids in corpus.group_by_weight(shape, candidate_ids).items():
+            total += weight * len(ids)
+            for word_id in ids:
+                signature = {}
+                for position, char in enumerate(letters_only(bucket[word_id])):
+                    signature[char] = signature.get(char, 0) | (1 << position)
+                for char, positions in signature.items():
+                    code = ord(char) - 97
+                    if 0 <= code < 26:
+                        groups[code][positions] = groups[code].get(positions, 0) + weight
+
+        sizes = []
+        for letter_groups in groups:
+            misses = total - sum(letter_groups.values())
+            sizes.append(misses * misses + sum(size * size for size in letter_groups.values()))
+        return sizes
+
+
+class RegexEngine(CandidateEngine):
+    """
+    Finds candidates by matching every entry of the shape bucket against a regex
+    built from the mask. Blanks only accept letters that have not been revealed, and
+    entries containing a wrong guess are dropped with one AND on their letter mask.
+    """
+    name = "regex"
+
+    def candidate_ids(self, corpus, shape, parts, guessed_letters, within=None):
+        """
+        Returns the ids (positions within the shape bucket) of the entries that match
+        the per-word patterns in `parts` and avoid the wrongly guessed letters, or None
+        if no pattern could be built. If `within` is given, only those ids are considered.
+        """
+        constraints = MaskConstraints(parts, guessed_letters)
+        if within is not None:
+            return narrow_ids(corpus, shape, within, constraints)
+
+        blank = f"[^{''.join(sorted(constraints.revealed_letters))}]" if constraints.revealed_letters else '.'
+        final_pattern = r'\s+'.join(part.replace('_', blank) for part in parts)
+
+        try:
+            # Compile the regex for an exact match from start to end.
+            regex = re.compile(f"^{final_pattern}$")
+        except re.error as e:
+            logger.warning("Error compiling regex: %s -> %s", final_pattern, e, extra={"pattern": final_pattern})
+            return None # Cannot proceed if the pattern is invalid
+
+        bucket = corpus.bucket(shape)
+        masks = bucket_letter_masks(corpus, shape)
+        miss_mask = constraints.miss_mask
+        return [i for i, word in enumerate(bucket) if not masks[i] & miss_mask and regex.match(word)]
+
+
+class BitmapEngine(CandidateEngine):
+    """
+    Finds candidates with a positional letter index instead of a regex.
+
+    For each shape bucket it precomputes, the first time the bucket is used, one bitset
+    of word ids per (position, letter) pair and one per (letter, number of occurrences)
+    pair. The candidates for a mask are the bitwise AND of the bitsets of its revealed
+    positions, of "contains exactly as many of this letter as the mask shows" for each
+    revealed letter (so no revealed letter hides in a blank), and of "does not contain
+    this letter" for each wrong guess.
+    """
+    name = "bitmap"
+
+    def candidate_ids(self, corpus, shape, parts, guessed_letters, within=None):
+        """
+        Returns the ids of the entries of the shape bucket that satisfy the mask and the
+        guessed letters. If `within` is given, only those ids are considered.
+        """
+        constraints = MaskConstraints(parts, guessed_letters)
+        if within is not None and not isinstance(within, BitmapCandidates):
+            return narrow_ids(corpus, shape, within, constraints)
+
+        size, positions, counts = self._tables(corpus, shape)
+
+        # Narrowing the previous turn's survivors is one more AND on the bitset.
+        bits = within.bits if within is not None else (1 << size) - 1
+        for key in constraints.revealed_positions:
+            bits &= positions.get(key, 0)
+            if not bits:
+                return []
+        for letter in constraints.revealed_letters:
+            bits &= counts.get((letter, constraints.pattern.count(letter)), 0)
+        for letter in constraints.missed_letters:
+            bits &= counts.get((letter, 0), bits)
+        return BitmapCandidates(bits, size)
+
+    def prepare(self, corpus, shape):
+        super().prepare(corpus, shape)
+        self._tables(corpus, shape)
+
+    def partition_sizes(self, corpus, shape, candidate_ids):
+        """Same sizes as CandidateEngine.partition_sizes, from popcounts of the groups found by _letter_groups."""
+        if not isinstance(candidate_ids, BitmapCandidates):
+            return super().partition_sizes(corpus, shape, candidate_ids)
+        total = candidate_ids.bits.bit_count()
+        sizes = []
+        for groups in self._letter_groups(corpus, shape, candidate_ids.bits):
+            group_sizes = [group.bit_count() for group in groups]
+            misses = total - sum(group_sizes)
+            sizes.append(misses * misses + sum(size * size for size in group_sizes))
+        return sizes
+
+    def weighted_partition_sizes(self, corpus, shape, candidate_ids):
+        """Same as partition_sizes, weighing each group with one popcount per weight range."""
+        if not isinstance(candidate_ids, BitmapCandidates):
+            return super().weighted_partition_sizes(corpus, shape, candidate_ids)
+        weight_bits = self._weight_bits(corpus, shape)
+
+        def weigh(bits):
+            return sum(weight * (bits & range_bits).bit_count() for weight, range_bits in weight_bits)
+
+        total = weigh(candidate_ids.bits)
+        sizes = []
+        for groups in self._letter_groups(corpus, shape, candidate_ids.bits):
+            group_sizes = [weigh(group) for group in groups]
+            misses = total - sum(group_sizes)
+            sizes.append(misses * misses + sum(size * size for size in group_sizes))
+        return sizes
+
+    def _letter_groups(self, corpus, shape, bits):
+        """
+        Returns, for each letter a-z, the bitsets of the groups the candidates in `bits`
+        containing it split into by the positions it sits at. Each group starts as all
+        the candidates with the letter and is split in two by the (position, letter)
+        bitset of every position, so the work is a few big-integer ANDs per group
+        instead of a pass over every candidate.
+        """
+        _, positions, counts = self._tables(corpus, shape)
+        rows = [[] for _ in range(26)]
+        for (_, char), row in positions.items():
+            code = ord(char) - 97
+            if 0 <= code < 26 and bits & row:
+                rows[code].append(row)
+
+        letter_groups = []
+        for code, letter_rows in enumerate(rows):
+            groups = [bits & ~counts[(chr(97 + code), 0)]] if letter_rows else []
+            for row in letter_rows:
+                split = []
+                for group in groups:
+                    inside = group & row
+                    if inside and inside != group:
+                        split.append(inside)
+                        split.append(group ^ inside)
+                    else:
+                        split.append(group)
+                groups = split
+            letter_groups.append(groups)
+        return letter_groups
+
+    def session_candidates(self, candidate_ids):
+        """Keeps only the bitset (size / 8 bytes), not the ids decoded for scoring."""
+        if isinstance(candidate_ids, BitmapCandidates):
+            return BitmapCandidates(candidate_ids.bits, candidate_ids.size)
+        return super().session_candidates(candidate_ids)
+
+    def weighted_letter_counts(self, corpus, shape, candidate_ids):
+        """Counts each letter with one popcount per (position, letter) bitset and weight range."""
+        if not isinstance(candidate_ids, BitmapCandidates):
+            return super().weighted_letter_counts(corpus, shape, candidate_ids)
+        _, positions, _ = self._tables(corpus, shape)
+        counts = [0] * 26
+        for weight, range_bits in self._weight_bits(corpus, shape):
+            bits = candidate_ids.bits & range_bits
+            if not bits:
+                continue
+            for (_, char), row in positions.items():
+                code = ord(char) - 97
+                if 0 <= code < 26:
+                    counts[code] += weight * (bits & row).bit_count()
+        return counts
+
+    def weighted_letter_presence(self, corpus, shape, candidate_ids):
+        """Counts the candidates containing each letter with popcounts on the "none of this letter" bitsets."""
+        if not isinstance(candidate_ids, BitmapCandidates):
+            return super().weighted_letter_presence(corpus, shape, candidate_ids)
+        _, _, counts = self._tables(corpus, shape)
+        presence = [0] * 26
+        for weight, range_bits in self._weight_bits(corpus, shape):
+            bits = candidate_ids.bits & range_bits
+            if not bits:
+                continue
+            total = bits.bit_count()
+            for (char, occurrences), row in counts.items():
+                code = ord(char) - 97
+                if occurrences == 0 and 0 <= code < 26:
+                    presence[code] += weight * (total - (bits & row).bit_count())
+        return presence
+
+    @staticmethod
+    def _weight_bits(corpus, shape):
+        """Returns (weight, bitset of its word ids) for each weight range of a weighted shape bucket."""
+        return corpus.derived(("weight_bits", shape), lambda: [
+            (weight, ((1 << end) - 1) ^ ((1 << start) - 1)) for weight, start, end in corpus.weight_ranges(shape)])
+
+    def _tables(self, corpus, shape):
+        """Returns the bitset tables of a shape bucket, built once and kept on the index."""
+        return corpus.derived((self.name, shape), lambda: self._build(corpus.bucket(shape)))
+
+    @staticmethod
+    def _build(bucket):
+        """Builds the position and letter-count bitset tables for one shape bucket."""
+        size = len(bucket)
+        num_bytes = (size + 7) // 8
+        position_rows = {}
+        count_rows = {}
+        for word_id, word in enumerate(bucket):
+            byte_index, bit = word_id >> 3, 1 << (word_id & 7)
+            letters = letters_only(word)
+            for key in enumerate(letters):
+                row = position_rows.get(key)
+                if row is None:
+                    row = position_rows[key] = bytearray(num_bytes)
+                row[byte_index] |= bit
+            for letter in set(letters):
+                key = (letter, letters.count(letter))
+                row = count_rows.get(key)
+                if row is None:
+                    row = count_rows[key] = bytearray(num_bytes)
+                row[byte_index] |= bit
+
+        positions = {key: int.from_bytes(row, 'little') for key, row in position_rows.items()}
+        counts = {key: int.from_bytes(row, 'little') for key, row in count_rows.items()}
+        # "Contains none of this letter" is the complement of every non-zero count.
+        everything = (1 << size) - 1
+        for letter in {letter for letter, _ in counts}:
+            present = 0
+            for (other, _), row in counts.items():
+                if other == letter:
+                    present |= row
+            counts[(letter, 0)] = everything & ~present
+        return size, positions, counts
+
+
+class NumpyEngine(CandidateEngine):
+    """
+    Filters and scores with NumPy array operations.
+
+    Each shape bucket is stored, the first time it is used, as an (entries x letters)
+    uint8 matrix of letter codes plus a uint32 array of 26-bit letter masks. Filtering
+    is a handful of column comparisons and scoring is a single bincount, which pays
+    off when early guesses leave tens of thousands of candidates.
+    """
+    name = "numpy"
+
+    def __init__(self):
+        if np is None:
+            raise ImportError("The 'numpy' engine requires NumPy (pip install numpy).")
+
+    def candidate_ids(self, corpus, shape, parts, guessed_letters, within=None):
+        """
+        Returns the ids of the entries of the shape bucket that satisfy the mask and the
+        guessed letters, as an array. If `within` is given, only those ids are considered.
+        """
+        constraints = MaskConstraints(parts, guessed_letters)
+        matrix, masks = self._arrays(corpus, shape)
+        ids = np.arange(len(masks)) if within is None else np.asarray(within, dtype=np.intp)
+
+        # Cheap whole-row checks first, so the blank check only sees the survivors.
+        keep = np.ones(len(ids), dtype=bool)
+        if constraints.miss_mask:
+            keep &= (masks[ids] & np.uint32(constraints.miss_mask)) == 0
+        for position, char in constraints.revealed_positions:
+            keep &= matrix[ids, position] == ord(char) - 97
+        ids = ids[keep]
+
+        if len(ids) and constraints.revealed_letters and constraints.blank_positions:
+            blanks = matrix[np.ix_(ids, constraints.blank_positions)]
+            revealed_mask = np.uint32(letter_mask("".join(constraints.revealed_letters)))
+            hidden = np.bitwise_or.reduce(np.left_shift(np.uint32(1), np.minimum(blanks, 31).astype(np.uint32)), axis=1)
+            ids = ids[(hidden & revealed_mask) == 0]
+        return ids
+
+    def session_candidates(self, candidate_ids):
+        """Keeps the ids as a uint32 array, half the size of the intp array they were computed as."""
+        return candidate_ids.astype(np.uint32) if candidate_ids is not None else None
+
+    def best_letter(self, corpus, shape, candidate_ids, guessed_letters):
+        """Same choice as the Counter-based scorer, tie-breaks included, computed with bincount."""
+        matrix, _ = self._arrays(corpus, shape)
+        letters = matrix[candidate_ids].ravel()
+        counts = np.bincount(letters, minlength=256)[:26]
+
+        guessed = set(guessed_letters)
+        for code in range(26):
+            if chr(97 + code) in guessed:
+                counts[code] = 0
+        best_count = counts.max()
+        if best_count == 0:
+            return None
+
+        # Counter.most_common breaks ties by first appearance, so do the same.
+        tied = np.flatnonzero(counts == best_count)
+        if len(tied) > 1:
+            tied = [min(tied, key=lambda code: np.argmax(letters == code))]
+        return chr(97 + int(tied[0]))
+
+    def prepare(self, corpus, shape):
+        self._arrays(corpus, shape)
+
+    def letter_presence(self, corpus, shape, candidate_ids):
+        """Returns, for each letter a-z, the number of candidates that contain it."""
+        _, masks = self._arrays(corpus, shape)
+        bits = masks[candidate_ids][:, None] >> np.arange(26, dtype=np.uint32)
+        return [int(count) for count in (bits & 1).sum(axis=0)]
+
+    def partition_sizes(self, corpus, shape, candidate_ids):
+        """
+        Same as the base implementation, but groups the candidates by hashing each row's
+        reveal pattern for a letter in one matrix-vector product per letter.
+        """
+        matrix, _ = self._arrays(corpus, shape)
+        rows = matrix[candidate_ids]
+        total = len(rows)
+        weights = self._pattern_weights(rows.shape[1])
+        sizes = []
+        for code in range(26):
+            hits = rows == code
+            if not hits.any():
+                sizes.append(total * total)
+                continue
+            _, counts = np.unique(hits.astype(np.uint64) @ weights, return_counts=True)
+            sizes.append(int((counts.astype(np.int64) ** 2).sum()))
+        return sizes
+
+    # Weighted scoring: the same array operations, with each candidate counted by its
+    # weight. Counting is done per weight range, so the results stay exact integers.
+
+    def weighted_letter_counts(self, corpus, shape, candidate_ids):
+        """Returns, for each letter a-z, its weighted number of occurrences, with one bincount per weight range."""
+        matrix, _ = self._arrays(corpus, shape)
+        counts = np.zeros(26, dtype=np.int64)
+        for weight, ids in self._weight_groups(corpus, shape, candidate_ids):
+            counts += weight * np.bincount(matrix[ids].ravel(), minlength=256)[:26]
+        return [int(count) for count in counts]
+
+    def weighted_letter_presence(self, corpus, shape, candidate_ids):
+        """Returns, for each letter a-z, the total weight of the candidates that contain it."""
+        presence = np.zeros(26, dtype=np.int64)
+        for weight, ids in self._weight_groups(corpus, shape, candidate_ids):
+            presence += weight * np.array(self.letter_presence(corpus, shape, ids), dtype=np.int64)
+        return [int(count) for count in presence]
+
+    def weighted_partition_sizes(self, corpus, shape, candidate_ids):
+        """Same as partition_sizes, summing the weights of each reveal pattern's rows with a bincount."""
+        matrix, _ = self._arrays(corpus, shape)
+        ids = np.asarray(candidate_ids, dtype=np.intp)
+        rows = matrix[ids]
+        row_weights = self._row_weights(corpus, shape)[ids]
+        total = int(row_weights.sum())
+        weights = self._pattern_weights(rows.shape[1])
+        sizes = []
+        for code in range(26):
+            hits = rows == code
+            if not hits.any():
+                sizes.append(total * total)
+                continue
+            # Only the rows holding the letter need hashing; the others make up the miss group.
+            present = hits.any(axis=1)
+            _, groups = np.unique(hits[present].astype(np.uint64) @ weights, return_inverse=True)
+            group_weights = np.bincount(groups.ravel(), weights=row_weights[present]).round().astype(np.int64)
+            misses = total - int(group_weights.sum())
+            sizes.append(misses * misses + int((group_weights ** 2).sum()))
+        return sizes
+
+    @staticmethod
+    def _row_weights(corpus, shape):
+        """Returns the weight of every entry of a weighted shape bucket, as an int64 array."""
+        def build():
+            weights = np.zeros(len(corpus.bucket(shape)), dtype=np.int64)
+            for weight, start, end in corpus.weight_ranges(shape):
+                weights[start:end] = weight
+            return weights
+        return corpus.derived(("numpy_weights", shape), build)
+
+    @staticmethod
+    def _weight_groups(corpus, shape, candidate_ids):
+        """Yields (weight, candidate ids in its range) for each weight range the candidates fall in."""
+        ids = np.sort(np.asarray(candidate_ids, dtype=np.intp))
+        for weight, start, end in corpus.weight_ranges(shape):
+            low, high = np.searchsorted(ids, (start, end))
+            if high > low:
+                yield weight, ids[low:high]
+
+    @staticmethod
+    def _pattern_weights(width):
+        """
+        Per-position weights that turn a row of hit flags into one integer. Up to 64
+        positions the weights are powers of two, so the hash is exact; longer phrases use
+        fixed random 64-bit weights, where a collision is vanishingly unlikely.
+        """
+        if width <= 64:
+            return np.left_shift(np.uint64(1), np.arange(width, dtype=np.uint64))
+        return np.random.default_rng(0).integers(1, 2 ** 63, size=width, dtype=np.uint64) | np.uint64(1)
+
+    @staticmethod
+    def _arrays(corpus, shape):
+        """Returns the letter-code matrix and letter masks of a shape bucket."""
+        def build():
+            bucket = corpus.bucket(shape)
+            width = sum(shape)
+            raw = "".join(letters_only(word) for word in bucket).encode('ascii', errors='replace')
+            matrix = (np.frombuffer(raw, dtype=np.uint8) - 97).reshape(len(bucket), width)
+            # Codes outside a-z land on bits 26-31, which no guessed letter ever uses.
+            bits = np.left_shift(np.uint32(1), np.minimum(matrix, 31).astype(np.uint32))
+            masks = np.bitwise_or.reduce(bits, axis=1) if width else np.zeros(len(bucket), dtype=np.uint32)
+            return matrix, masks
+        return corpus.derived(("numpy", shape), build)
+
+
+class TrieCandidates(list):
+    """
+    The candidate ids found by a trie walk, together with the letter statistics the walk
+    gathered on the way: for each letter a-z, its number of occurrences over the
+    candidates and where it first occurs, as (candidate id, position).
+    """
+
+    def __init__(self, ids, letter_counts, first_seen):
+        super().__init__(ids)
+        self.letter_counts = letter_counts
+        self.first_seen = first_seen
+
+
+class Trie:
+    """
+    A prefix tree over the entries (spaces removed) of one shape bucket, stored as flat
+    arrays in breadth-first order. Every entry of a bucket has the same length, so all
+    leaves sit at the same depth and the children of a node are one contiguous range.
+
+    labels      one byte per node: its letter code (letter - 'a'); the root's is unused
+    first_child per internal node, the index of its first child; the children of node i
+                are first_child[i] up to first_child[i + 1]
+    leaf_base   index of the first leaf
+    ids         the word ids, ordered by entry (ties by id)
+    leaf_start  per leaf, where its word ids start in `ids` (plus an end sentinel)
+    """
+
+    __slots__ = ("width", "labels", "first_child", "leaf_base", "ids", "leaf_start")
+
+    def __init__(self, bucket, width):
+        rows = sorted((letters_only(word).encode('ascii', errors='replace'), word_id)
+                      for word_id, word in enumerate(bucket))
+        labels = bytearray(1)
+        first_child = array('I')
+        level = [(0, len(rows))]
+        for depth in range(width):
+            next_level = []
+            for low, high in level:
+                first_child.append(len(labels))
+                start = low
+                while start < high:
+                    char = rows[start][0][depth]
+                    end = start + 1
+                    while end < high and rows[end][0][depth] == char:
+                        end += 1
+                    labels.append((char - 97) & 0xFF)
+                    next_level.append((start, end))
+                    start = end
+            level = next_level
+        first_child.append(len(labels))
+
+        self.width = width
+        self.labels = bytes(labels)
+        self.first_child = first_child
+        self.leaf_base = len(labels) - len(level)
+        self.ids = array('I', (word_id for _, word_id in rows))
+        self.leaf_start = array('I', [low for low, _ in level] + [len(rows)])
+
+    def nbytes(self):
+        """Returns the size of the trie's arrays in bytes."""
+        return sum(len(buffer) * buffer.itemsize for buffer in (self.first_child, self.ids, self.leaf_start)) \
+            + len(self.labels)
+
+    def walk(self, constraints):
+        """
+        Returns the TrieCandidates of the entries that satisfy `constraints`.
+
+        The walk goes down one level per position and only follows the edges the mask
+        allows: the revealed letter at a revealed position, and at a blank any letter that
+        is neither revealed nor missed. A subtree is never entered once its prefix fails.
+        The matches are then counted back up the surviving nodes, adding each node's
+        match count to its letter, so letters are tallied once per shared prefix instead
+        of once per candidate.
+        """
+        labels, first_child = self.labels, self.first_child
+        # Letter codes a blank may take: anything but a revealed or missed letter.
+        excluded = {ord(letter) - 97 for letter in constraints.revealed_letters | constraints.missed_letters
+                    if letter_bit(letter)}
+        blank_allowed = bytes(code not in excluded for code in range(256))
+
+        levels = []
+        frontier = [0]
+        for char in constraints.pattern:
+            nodes, parents = [], []
+            if char == '_':
+                for index, node in enumerate(frontier):
+                    for child in range(first_child[node], first_child[node + 1]):
+                        if blank_allowed[labels[child]]:
+                            nodes.append(child)
+                            parents.append(index)
+            else:
+                label = bytes([(ord(char) - 97) & 0xFF])
+                for index, node in enumerate(frontier):
+                    child = labels.find(label, first_child[node], first_child[node + 1])
+                    if child >= 0:
+                        nodes.append(child)
+                        parents.append(index)
+            if not nodes:
+                return TrieCandidates([], [0] * 26, [None] * 26)
+            levels.append((nodes, parents))
+            frontier = nodes
+
+        ids, leaf_start, leaf_base = self.ids, self.leaf_start, self.leaf_base
+        counts, firsts, candidate_ids = [], [], []
+        for node in frontier:
+            start, end = leaf_start[node - leaf_base], leaf_start[node - leaf_base + 1]
+            counts.append(end - start)
+            firsts.append(ids[start])
+            candidate_ids.extend(ids[start:end])
+
+        letter_counts = [0] * 26
+        first_seen = [None] * 26
+        for depth in range(len(levels) - 1, -1, -1):
+            nodes, parents = levels[depth]
+            size = len(levels[depth - 1][0]) if depth else 1
+            parent_counts, parent_firsts = [0] * size, [None] * size
+            for node, parent, count, first in zip(nodes, parents, counts, firsts):
+                if not count:
+                    continue  # A prefix that survived the walk down but no leaf below it did.
+                code = labels[node]
+                if code < 26:
+                    letter_counts[code] += count
+                    seen = first_seen[code]
+                    if seen is None or (first, depth) < seen:
+                        first_seen[code] = (first, depth)
+                parent_counts[parent] += count
+                if parent_firsts[parent] is None or first < parent_firsts[parent]:
+                    parent_firsts[parent] = first
+            counts, firsts = parent_counts, parent_firsts
+
+        candidate_ids.sort()
+        return TrieCandidates(candidate_ids, letter_counts, first_seen)
+
+
+class TrieEngine(CandidateEngine):
+    """
+    Finds candidates by walking a prefix tree of each shape bucket (see Trie), pruning
+    every subtree whose prefix contradicts the mask, and counts the letters during the
+    same walk, so the default frequency scoring needs no second pass over the words.
+    """
+    name = "trie"
+
+    def candidate_ids(self, corpus, shape, parts, guessed_letters, within=None):
+        """
+        Returns the ids of the entries of the shape bucket that satisfy the mask and the
+        guessed letters. If `within` is given, only those ids are considered.
+        """
+        constraints = MaskConstraints(parts, guessed_letters)
+        if within is not None:
+            return narrow_ids(corpus, shape, within, constraints)
+        return self.trie(corpus, shape).walk(constraints)
+
+    def session_candidates(self, candidate_ids):
+        """The pruned walk beats checking the survivors one by one, so sessions keep nothing."""
+        return None
+
+    def best_letter(self, corpus, shape, candidate_ids, guessed_letters):
+        """Same choice as the Counter-based scorer, tie-breaks included, from the walk's letter counts."""
+        if not isinstance(candidate_ids, TrieCandidates):
+            return super().best_letter(corpus, shape, candidate_ids, guessed_letters)
+        guessed = set(guessed_letters)
+        best_code, best_key = None, None
+        for code, count in enumerate(candidate_ids.letter_counts):
+            if not count or chr(97 + code) in guessed:
+                continue
+            # Counter.most_common breaks ties by first appearance, so do the same.
+            key = (-count, candidate_ids.first_seen[code])
+            if best_key is None or key < best_key:
+                best_code, best_key = code, key
+        return chr(97 + best_code) if best_code is not None else None
+
+    def prepare(self, corpus, shape):
+        super().prepare(corpus, shape)
+        self.trie(corpus, shape)
+
+    @staticmethod
+    def trie(corpus, shape):
+        """Returns the trie of a shape bucket, built once and kept on the index."""
+        return corpus.derived(("trie", shape), lambda: Trie(corpus.bucket(shape), sum(shape)))
+
+
+ENGINES = {engine.name: engine for engine in (RegexEngine, BitmapEngine, NumpyEngine, TrieEngine)}
+
+
+def create_engine(name):
+    """Returns a new filtering engine by name (see ENGINES)."""
+    try:
+        return ENGINES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown filtering engine '{name}'. Choose one of: {', '.join(ENGINES)}") from None
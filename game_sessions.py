@@ -0,0 +1,86 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class GameSession:
+    """
+    The state the server keeps for one game: the shape of its mask, the letters seen
+    so far and, per corpus, the ids of the candidates that survived the last guess.
+    """
+
+    def __init__(self, game_id):
+        self.game_id = game_id
+        self.generation = None
+        self.shape = None
+        self.guessed_letters = frozenset()
+        self.candidates = {}
+        self.last_used = time.monotonic()
+
+    def sync(self, shape, guessed_letters, generation=None):
+        """
+        Prepares the session for a new turn. The stored candidates are only reused when
+        the mask still has the same shape and no guessed letter has disappeared (anything
+        else means the client started over), and when the corpora have not been reloaded
+        since (candidate ids point into one corpus snapshot, identified by `generation`).
+        """
+        guessed_letters = frozenset(guessed_letters)
+        if shape != self.shape or not self.guessed_letters <= guessed_letters or generation != self.generation:
+            self.candidates = {}
+        self.generation = generation
+        self.shape = shape
+        self.guessed_letters = guessed_letters
+
+
+class SessionStore:
+    """
+    A thread-safe store of game sessions with TTL and LRU eviction, so memory stays
+    bounded no matter how many games are started and abandoned.
+    """
+
+    def __init__(self, max_sessions=10000, ttl_seconds=1800):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get_or_create(self, game_id=None):
+        """
+        Returns the live session for `game_id`. A new session, with a new id, is created
+        when no id is given or when the session has expired or been evicted.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            session = self._sessions.get(game_id) if game_id else None
+            if session is None:
+                session = GameSession(uuid.uuid4().hex)
+                self._sessions[session.game_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(game_id)
+            session.last_used = now
+            return session
+
+    def discard(self, game_id):
+        """Forgets a session, e.g. once its game is over."""
+        with self._lock:
+            self._sessions.pop(game_id, None)
+
+    def clear(self):
+        """Forgets every session."""
+        with self._lock:
+            self._sessions.clear()
+
+    def _evict_expired(self, now):
+        # Sessions are ordered from least to most recently used, so expired ones are at the front.
+        while self._sessions:
+            oldest = next(iter(self._sessions.values()))
+            if now - oldest.last_used <= self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
@@ -0,0 +1,58 @@
+import threading
+from collections import OrderedDict
+
+
+class GuessCache:
+    """
+    A bounded, thread-safe LRU cache of guesses keyed on canonical game states
+    (see corpus_index.state_key) and strategy, with hit/miss/eviction counters.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Returns the cached guess for `key`, or None."""
+        with self._lock:
+            guess = self._entries.get(key)
+            if guess is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._entries.move_to_end(key)
+            return guess
+
+    def put(self, key, guess):
+        """Stores a guess, evicting the least recently used entries beyond `maxsize`."""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = guess
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Drops every entry (the counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """Returns the cache counters as a dict."""
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,141 @@
+import bisect
+import cProfile
+import os
+import random
+import threading
+import time
+
+# Upper bounds of the latency histogram buckets, in seconds.
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# Upper bounds of the candidate-set-size histogram buckets.
+CANDIDATE_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 25000, 100000)
+
+
+class Histogram:
+    """A cumulative histogram in the Prometheus sense: per-bucket counts, a sum and a count."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last bucket is +Inf.
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        """Yields the (name, labels, value) samples of this histogram."""
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield f"{name}_bucket", labels + (("le", le),), cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+def format_family(name, kind, help_text, samples):
+    """
+    Formats one metric family in the Prometheus text exposition format. `samples` are
+    (name, labels, value) triples, where labels is a tuple of (label, value) pairs.
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for sample_name, labels, value in samples:
+        label_text = ",".join(f'{label}="{label_value}"' for label, label_value in labels)
+        lines.append(f"{sample_name}{{{label_text}}} {value}" if label_text else f"{sample_name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class GuessMetrics:
+    """
+    Thread-safe counters and histograms of where make_guess spends its time: the total
+    latency of every guess, the time of each stage ("lookup" in the opening table and
+    guess cache, then "filter" and "score" per corpus tier, and "fallback"), which tier
+    answered, and how many candidates each corpus tier had to score.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._guess_seconds = Histogram(LATENCY_BUCKETS)
+        self._answers = {}
+        self._stages = {}
+        self._candidates = {}
+
+    def observe_guess(self, tier, seconds):
+        """Records a finished guess: the tier that answered it and its total latency."""
+        with self._lock:
+            self._guess_seconds.observe(seconds)
+            self._answers[tier] = self._answers.get(tier, 0) + 1
+
+    def observe_stage(self, stage, tier, seconds):
+        with self._lock:
+            histogram = self._stages.get((stage, tier))
+            if histogram is None:
+                histogram = self._stages[(stage, tier)] = Histogram(LATENCY_BUCKETS)
+            histogram.observe(seconds)
+
+    def observe_candidates(self, tier, count):
+        with self._lock:
+            histogram = self._candidates.get(tier)
+            if histogram is None:
+                histogram = self._candidates[tier] = Histogram(CANDIDATE_BUCKETS)
+            histogram.observe(count)
+
+    def render(self):
+        """Returns the metrics in the Prometheus text exposition format."""
+        with self._lock:
+            return "".join([
+                format_family("hangman_guess_seconds", "histogram", "Latency of make_guess.",
+                              self._guess_seconds.samples("hangman_guess_seconds", ())),
+                format_family("hangman_guesses_total", "counter", "Guesses made, by the tier that answered them.",
+                              ((("hangman_guesses_total", (("tier", tier),), count))
+                               for tier, count in sorted(self._answers.items()))),
+                format_family("hangman_stage_seconds", "histogram", "Time spent in each stage of make_guess, per tier.",
+                              (sample for (stage, tier), histogram in sorted(self._stages.items())
+                               for sample in histogram.samples("hangman_stage_seconds",
+                                                               (("stage", stage), ("tier", tier))))),
+                format_family("hangman_candidates", "histogram", "Number of candidates scored by each corpus tier.",
+                              (sample for tier, histogram in sorted(self._candidates.items())
+                               for sample in histogram.samples("hangman_candidates", (("tier", tier),)))),
+            ])
+
+
+class SampledProfiler:
+    """
+    Runs a sample of calls under cProfile and dumps each profile to its own file in
+    `output_dir` (read them with `python -m pstats <file>`). Only one call is profiled
+    at a time; calls that are not sampled run unprofiled, at no extra cost.
+    """
+
+    def __init__(self, sample_rate, output_dir="profiles"):
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self._lock = threading.Lock()
+
+    def run(self, name, function, *args, **kwargs):
+        """Calls function(*args, **kwargs), profiling it if it is sampled. `name` prefixes the dump file."""
+        if random.random() >= self.sample_rate or not self._lock.acquire(blocking=False):
+            return function(*args, **kwargs)
+        try:
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(function, *args, **kwargs)
+            finally:
+                os.makedirs(self.output_dir, exist_ok=True)
+                profile.dump_stats(os.path.join(self.output_dir, f"{name}-{time.time_ns()}.prof"))
+        finally:
+            self._lock.release()
+
+
+def profiler_from_env():
+    """
+    Returns a SampledProfiler if HANGMAN_PROFILE_RATE (the fraction of requests to
+    profile, e.g. 0.01) is set, and None otherwise. Profiles are written to
+    HANGMAN_PROFILE_DIR (default "profiles").
+    """
+    sample_rate = os.environ.get("HANGMAN_PROFILE_RATE")
+    if not sample_rate or float(sample_rate) <= 0:
+        return None
+    return SampledProfiler(float(sample_rate), os.environ.get("HANGMAN_PROFILE_DIR", "profiles"))
@@ -0,0 +1,182 @@
+import hmac
+import os
+
+from guess_metrics import format_family
+from scorers import SCORERS
+
+# Upper bound on the number of games in one /guess/batch request.
+MAX_BATCH_SIZE = 5000
+
+
+class BadRequest(Exception):
+    """Raised when a request payload does not follow the /guess contract."""
+
+
+def parse_guess_request(data):
+    """
+    Validates a /guess payload and returns its fields as a dict with the keys
+    'current_word_state', 'guessed_letters', 'strategy', 'use_session' and 'game_id'.
+    """
+    if not data:
+        raise BadRequest("Invalid request: No JSON payload received.")
+    if not isinstance(data, dict):
+        raise BadRequest("Invalid request: Expected a JSON object.")
+
+    current_word_state = data.get('currentWordState')
+    guessed_letters = data.get('guessedLetters')
+    if current_word_state is None or guessed_letters is None:
+        raise BadRequest("Invalid request: Missing 'currentWordState' or 'guessedLetters'.")
+    if not _is_game_state(current_word_state, guessed_letters):
+        raise BadRequest("Invalid request: 'currentWordState' must be a string and 'guessedLetters' a list of strings.")
+    if not isinstance(data.get('gameId'), (str, type(None))):
+        raise BadRequest("Invalid request: 'gameId' must be a string or null.")
+
+    return {
+        "current_word_state": current_word_state,
+        "guessed_letters": guessed_letters,
+        "strategy": _parse_strategy(data),
+        "use_session": 'gameId' in data,
+        "game_id": data.get('gameId'),
+    }
+
+
+def parse_batch_request(data):
+    """Validates a /guess/batch payload and returns its (current_word_state, guessed_letters) pairs and strategy."""
+    if not isinstance(data, dict) or not isinstance(data.get('games'), list):
+        raise BadRequest("Invalid request: Expected a JSON payload with a 'games' array.")
+
+    games = data['games']
+    if len(games) > MAX_BATCH_SIZE:
+        raise BadRequest(f"Invalid request: At most {MAX_BATCH_SIZE} games per batch.")
+
+    states = []
+    for i, game in enumerate(games):
+        if not isinstance(game, dict) or game.get('currentWordState') is None or game.get('guessedLetters') is None:
+            raise BadRequest(f"Invalid request: Game {i} is missing 'currentWordState' or 'guessedLetters'.")
+        if not _is_game_state(game['currentWordState'], game['guessedLetters']):
+            raise BadRequest(f"Invalid request: In game {i}, 'currentWordState' must be a string and "
+                             f"'guessedLetters' a list of strings.")
+        states.append((game['currentWordState'], game['guessedLetters']))
+    return states, _parse_strategy(data)
+
+
+def _is_game_state(current_word_state, guessed_letters):
+    return isinstance(current_word_state, str) and isinstance(guessed_letters, list) \
+        and all(isinstance(letter, str) for letter in guessed_letters)
+
+
+def _parse_strategy(data):
+    strategy = data.get('strategy')
+    if strategy is not None and (not isinstance(strategy, str) or strategy not in SCORERS):
+        raise BadRequest(f"Invalid request: Unknown strategy '{strategy}'. Choose one of: {', '.join(SCORERS)}.")
+    return strategy
+
+
+def is_admin(provided_token):
+    """
+    Checks an admin token against HANGMAN_ADMIN_TOKEN. Admin endpoints are disabled
+    (every token is rejected) when the variable is not set.
+    """
+    expected = os.environ.get("HANGMAN_ADMIN_TOKEN")
+    return bool(expected) and bool(provided_token) and hmac.compare_digest(expected, provided_token)
+
+
+def watch_corpora_from_env(ai_model):
+    """Starts reloading the corpora on file changes if HANGMAN_WATCH_INTERVAL (seconds) is set."""
+    interval = os.environ.get("HANGMAN_WATCH_INTERVAL")
+    if interval:
+        ai_model.watch_corpora(interval=float(interval))
+
+
+def lazy_general_from_env():
+    """Whether to load the general corpus in the background (HANGMAN_LAZY_GENERAL, on unless "0")."""
+    return os.environ.get("HANGMAN_LAZY_GENERAL", "1") != "0"
+
+
+class GuessService:
+    """
+    Serves the /guess contract on top of a HangmanAI, independently of the web framework
+    (api.py serves it with Flask, asgi.py with an async server).
+    """
+
+    def __init__(self, ai_model, sessions=None, profiler=None):
+        self.ai_model = ai_model
+        self.sessions = sessions
+        # An optional guess_metrics.SampledProfiler that profiles a sample of the requests.
+        self.profiler = profiler
+
+    def guess(self, fields):
+        """Makes the guess for a request parsed by parse_guess_request and returns the response body."""
+        session = None
+        if fields["use_session"] and self.sessions is not None:
+            session = self.sessions.get_or_create(fields["game_id"])
+
+        info = {}
+        next_guess = self._call("guess", self.ai_model.make_guess, fields["current_word_state"],
+                                fields["guessed_letters"], session=session, strategy=fields["strategy"], info=info)
+
+        response = {
+            "nextGuess": next_guess
+        }
+        if info.get("tier") == "degraded":
+            # Made while the general corpus was still loading (see HangmanAI lazy_general).
+            response["degraded"] = True
+        if session is not None:
+            response["gameId"] = session.game_id
+        elif fields["use_session"]:
+            # Without a session store the game is served statelessly; the id is only echoed.
+            response["gameId"] = fields["game_id"]
+        return response
+
+    def guess_batch(self, states, strategy=None):
+        """Makes the guesses for a request parsed by parse_batch_request and returns the response body."""
+        info = {}
+        response = {"nextGuesses": self._call("batch", self.ai_model.make_guesses, states, strategy=strategy,
+                                              info=info)}
+        if "degraded" in info.get("tiers", ()):
+            response["degraded"] = True
+        return response
+
+    def health(self):
+        """
+        Returns the readiness response body: the service answers guesses as soon as it
+        exists, and 'general' tells whether the general corpus is still "loading", is
+        "ready", or "failed" to load (guesses it would answer are degraded until then).
+        """
+        return {"status": "ready", "general": self.ai_model.general_state,
+                "generation": self.ai_model.knowledge.generation}
+
+    def reload(self):
+        """Starts reloading the corpora in the background and returns the response body."""
+        self.ai_model.reload_corpora(background=True)
+        return {"status": "reloading", "generation": self.ai_model.knowledge.generation}
+
+    def metrics(self):
+        """Returns the model's metrics, with the guess cache and session counts, in the Prometheus text format."""
+        cache = self.ai_model.cache.stats()
+        families = [self.ai_model.metrics.render()]
+        for name, kind, help_text, value in (
+                ("hangman_cache_hits_total", "counter", "Guess cache hits.", cache["hits"]),
+                ("hangman_cache_misses_total", "counter", "Guess cache misses.", cache["misses"]),
+                ("hangman_cache_evictions_total", "counter", "Guess cache evictions.", cache["evictions"]),
+                ("hangman_cache_entries", "gauge", "Guesses in the guess cache.", cache["size"]),
+                ("hangman_corpus_generation", "gauge", "Number of times the corpora were reloaded.",
+                 self.ai_model.knowledge.generation)):
+            families.append(format_family(name, kind, help_text, [(name, (), value)]))
+        memory = self.ai_model.memory_report()
+        families.append(format_family(
+            "hangman_corpus_bytes", "gauge",
+            "Memory held by each corpus index: its entries (private or mapped) and the engine structures.",
+            [("hangman_corpus_bytes", (("corpus", name), ("part", part)), value)
+             for name, report in memory.items()
+             for part, value in (("entries", report["entry_bytes"]), ("mapped", report["mapped_bytes"]),
+                                 *report["index_bytes"].items())]))
+        if self.sessions is not None:
+            families.append(format_family("hangman_sessions", "gauge", "Open game sessions.",
+                                          [("hangman_sessions", (), len(self.sessions))]))
+        return "".join(families)
+
+    def _call(self, name, function, *args, **kwargs):
+        if self.profiler is None:
+            return function(*args, **kwargs)
+        return self.profiler.run(name, function, *args, **kwargs)
@@ -1,6 +1,53 @@
-import re
-from collections import Counter
+import json
+import logging
 import os
+import threading
+import time
+
+from corpus_index import (AIRLINES_CORPUS_FILE, GENERAL_CORPUS_FILE, CorpusIndex, WeightedCorpusIndex,
+                          corpora_fingerprint, occurrence_prior, split_word_state, state_key, state_shape)
+from filter_engines import create_engine
+from guess_cache import GuessCache
+from guess_metrics import GuessMetrics
+from letter_model import LETTER_MODEL_FILE, LetterModel
+from phrase_model import PhraseModel, word_bigrams
+from scorers import ENGLISH_LETTER_ORDER, create_scorer
+import corpus_store
+
+logger = logging.getLogger(__name__)
+
+# How the corpus tiers are combined: "strict" asks the general corpus only when no airline
+# entry matches, "weighted" filters one merged index in which entries carry source weights.
+TIER_MODES = ("strict", "weighted")
+# Default source weights of the "weighted" mode: one airline entry counts as 20 general ones.
+TIER_WEIGHTS = {"airlines": 20, "general": 1}
+
+
+class KnowledgeBase:
+    """
+    One immutable snapshot of everything loaded from the data directory: both corpus
+    indexes (and their weighted merge, in the "weighted" tier mode), the opening table,
+    the fallback letter model and the word pairs of the airline phrases. A guess reads
+    the current snapshot once and uses it throughout, so a reload can swap in a new
+    snapshot atomically while guesses that are already running finish on the old one.
+
+    A snapshot is not `complete` while the general corpus is still loading in the
+    background (its general corpus is empty and it has no letter model or merged index),
+    or when the general corpus came back empty because it is missing or unreadable.
+    """
+
+    def __init__(self, airlines_corpus, general_corpus, openings, openings_strategy, generation, letter_model=None,
+                 phrase_bigrams=None, combined_corpus=None, complete=True):
+        self.airlines_corpus = airlines_corpus
+        self.general_corpus = general_corpus
+        self.combined_corpus = combined_corpus
+        self.openings = openings
+        self.openings_strategy = openings_strategy
+        self.generation = generation
+        self.letter_model = letter_model
+        self.phrase_bigrams = phrase_bigrams
+        self.complete = complete
+
 
 class HangmanAI:
     """
@@ -8,114 +55,502 @@ class HangmanAI:
     It uses a probabilistic reduction approach with a multi-tiered fallback system.
     """
     
-    def __init__(self, data_dir="data"):
+    def __init__(self, data_dir="data", engine="bitmap", use_openings=True, cache_size=10000, use_binary=True,
+                 strategy="frequency", use_letter_model=True, use_phrase_model=True, phrase_bigrams=False,
+                 tiers="strict", tier_weights=None, frequency_prior=False, lazy_general=False):
         """
         Initializes the Algo by loading knowledge sources (corpora) into memory
         from the specified data directory.
+
+        Args:
+            data_dir (str): Directory that holds the corpus files.
+            engine (str): Candidate filtering and scoring engine: "bitmap" (default),
+                "regex", "trie" or "numpy" (requires NumPy).
+            use_openings (bool): Answer the first two guesses from the precomputed opening
+                table (data/openings.json, see build_artifacts.py) when it is available.
+            cache_size (int): Number of game states whose guesses are memoized (0 disables
+                the cache).
+            use_binary (bool): Memory-map the binary version of a corpus (built by
+                build_artifacts.py) instead of parsing the text file, when it is up to date.
+            strategy (str): Default letter scoring strategy: "frequency" (total letter
+                count), "presence" (candidates containing the letter) or "partition"
+                (fewest expected remaining candidates). Can be overridden per guess.
+            use_letter_model (bool): When no corpus entry matches, guess with the letter
+                model trained on the corpora (see letter_model.py) instead of a fixed
+                English letter order.
+            use_phrase_model (bool): When no corpus phrase matches a multi-word mask, look
+                each word up on its own and combine their letter distributions (see
+                phrase_model.py) before falling back to the letter model.
+            phrase_bigrams (bool): Weight the word candidates of the phrase model by the
+                adjacent word pairs of the airline phrases.
+            tiers (str): "strict" (default) tries the airline corpus, then the general one
+                only if no airline entry matches. "weighted" filters one index of both
+                corpora in a single pass, with each entry weighted by its sources, so
+                airline candidates are scored together with the general ones. The opening
+                table is only used in strict mode.
+            tier_weights (dict): Source weights of the weighted mode, by corpus name
+                ("airlines", "general"). Defaults to TIER_WEIGHTS.
+            frequency_prior (bool): In weighted mode, also weight each entry up by how often
+                its words occur in the airline corpus (see corpus_index.occurrence_prior).
+            lazy_general (bool): Return as soon as the airline corpus and the opening table
+                are loaded, and load the general corpus (with everything derived from it)
+                on a background thread. Until it is ready, guesses that the airline tier
+                cannot answer get a degraded answer (tier "degraded") instead of waiting;
+                see general_state.
         """
-        print("Initializing Hangman Algo...")
-        airlines_corpus_path = os.path.join(data_dir, "airlines_corpus.txt")
-        general_corpus_path = os.path.join(data_dir, "general_corpus.txt")
+        if tiers not in TIER_MODES:
+            raise ValueError(f"Unknown tier mode '{tiers}'. Choose one of: {', '.join(TIER_MODES)}")
+        logger.info("Initializing Hangman Algo...")
+        self.data_dir = data_dir
+        self.tiers = tiers
+        self.tier_weights = {**TIER_WEIGHTS, **(tier_weights or {})}
+        self.frequency_prior = frequency_prior
+        # The opening table was computed with the strict tiers, so it only answers for them.
+        self.use_openings = use_openings and tiers == "strict"
+        self.use_binary = use_binary
+        self.use_letter_model = use_letter_model
+        self.engine = create_engine(engine)
+        self.scorer = create_scorer(strategy)
+        self.cache = GuessCache(maxsize=cache_size)
+        self.phrase_model = PhraseModel(self.engine, cache_size=cache_size, use_bigrams=phrase_bigrams) \
+            if use_phrase_model else None
+        self.metrics = GuessMetrics()
 
-        self.airlines_corpus = self._load_corpus(airlines_corpus_path)
-        self.general_corpus = self._load_corpus(general_corpus_path)
-        
         # A fallback list of English letters ordered by frequency.
-        self.fallback_letters = list("eariotnslcudpmhgbfywkvxzjq")
-        print("Algo Initialized successfully.")
+        self.fallback_letters = list(ENGLISH_LETTER_ORDER)
+
+        self.knowledge = None
+        self._reload_lock = threading.Lock()
+        # "loading" while the general corpus loads in the background, then "ready", or
+        # "failed" if it could not be loaded (guesses stay degraded until a reload succeeds).
+        self.general_state = "loading"
+        self.load_corpora(include_general=not lazy_general)
+        if lazy_general:
+            threading.Thread(target=self._load_general, name="hangman-general", daemon=True).start()
+        logger.info("Algo Initialized successfully.")
+
+    @property
+    def airlines_corpus(self):
+        return self.knowledge.airlines_corpus
+
+    @property
+    def general_corpus(self):
+        return self.knowledge.general_corpus
+
+    def load_corpora(self, include_general=True):
+        """
+        (Re)loads the corpora and the opening table from the data directory and swaps
+        them in as one snapshot. Memoized guesses belong to the old corpora, so the
+        caches are cleared.
+
+        The new indexes are built before the swap, including the engine structures of
+        every bucket the old snapshot had already warmed up, so requests never pay for
+        a cold rebuild.
+
+        Without `include_general`, only the airline side is loaded and the snapshot is
+        marked incomplete (see KnowledgeBase).
+        """
+        with self._reload_lock:
+            old = self.knowledge
+            generation = old.generation + 1 if old is not None else 0
+
+            airlines_corpus_path = os.path.join(self.data_dir, AIRLINES_CORPUS_FILE)
+            general_corpus_path = os.path.join(self.data_dir, GENERAL_CORPUS_FILE)
+
+            # Each corpus is partitioned by word shape once, at load time, so that a guess
+            # only scans the entries that can possibly match the mask.
+            airlines_corpus = self._load_index(airlines_corpus_path, "airlines")
+            general_corpus = self._load_index(general_corpus_path, "general") \
+                if include_general else CorpusIndex([], name="general")
+
+            # Precomputed first and second guesses for every word shape, for one strategy.
+            openings, openings_strategy = self._load_openings(self.data_dir) if self.use_openings else ({}, None)
+
+            # Letter statistics by context, for masks that no corpus entry matches.
+            letter_model = self._load_letter_model(airlines_corpus, general_corpus) \
+                if self.use_letter_model and include_general else None
+
+            # Adjacent word pairs of the airline phrases, to weight the phrase model's words.
+            phrase_bigrams = word_bigrams(airlines_corpus) \
+                if self.phrase_model is not None and self.phrase_model.use_bigrams else None
+
+            # Both corpora merged into one weighted index, for the weighted tier mode.
+            combined_corpus = self._build_combined_index(airlines_corpus, general_corpus) \
+                if self.tiers == "weighted" and include_general else None
+
+            if old is not None:
+                self._prewarm(airlines_corpus, old.airlines_corpus)
+                self._prewarm(general_corpus, old.general_corpus)
+                if combined_corpus is not None and old.combined_corpus is not None:
+                    self._prewarm(combined_corpus, old.combined_corpus)
+
+            # _load_index returns an empty index when the general corpus is missing or
+            # unreadable; that snapshot is served degraded rather than as complete.
+            general_loaded = include_general and len(general_corpus) > 0
+            if include_general and not general_loaded:
+                logger.error("The general corpus is missing, empty or unreadable. Guesses it would answer are degraded.",
+                             extra={"path": general_corpus_path})
+
+            self.knowledge = KnowledgeBase(airlines_corpus, general_corpus, openings, openings_strategy, generation,
+                                           letter_model, phrase_bigrams, combined_corpus, general_loaded)
+            self.cache.clear()
+            if self.phrase_model is not None:
+                self.phrase_model.cache.clear()
+            if include_general:
+                self.general_state = "ready" if general_loaded else "failed"
+
+    def reload_corpora(self, background=True):
+        """
+        Reloads the corpora (see load_corpora), by default on a background thread so the
+        caller is not blocked. Returns the thread, or None when reloading in place.
+        """
+        if not background:
+            self.load_corpora()
+            return None
+        thread = threading.Thread(target=self._reload_safely, name="hangman-reload", daemon=True)
+        thread.start()
+        return thread
+
+    def watch_corpora(self, interval=5.0):
+        """
+        Starts a daemon thread that reloads the corpora whenever one of the files in the
+        data directory (corpora, binary corpora or opening table) changes.
+        """
+        def signature():
+            entries = []
+            for file_name in sorted(os.listdir(self.data_dir)):
+                if file_name.endswith((".txt", ".bin", ".json")):
+                    stat = os.stat(os.path.join(self.data_dir, file_name))
+                    entries.append((file_name, stat.st_mtime_ns, stat.st_size))
+            return entries
+
+        def watch():
+            last = None
+            while True:
+                try:
+                    current = signature()
+                except OSError as e:
+                    # E.g. a file replaced mid-scan: keep the last signature and poll again.
+                    logger.warning("Could not scan the data directory: %s", e, extra={"path": self.data_dir})
+                else:
+                    if last is not None and current != last:
+                        logger.info("Corpus files changed. Reloading...")
+                        self._reload_safely()
+                    last = current
+                time.sleep(interval)
+
+        thread = threading.Thread(target=watch, name="hangman-watch", daemon=True)
+        thread.start()
+        return thread
+
+    def memory_report(self):
+        """
+        Returns the memory held by each loaded corpus index, by name (see
+        CorpusIndex.memory_report): its entries, private or memory-mapped, and the
+        engine structures built on top of it.
+        """
+        knowledge = self.knowledge
+        indexes = [knowledge.airlines_corpus, knowledge.general_corpus, knowledge.combined_corpus]
+        return {index.name: index.memory_report() for index in indexes if index is not None}
+
+    def _load_general(self):
+        """Completes a lazy start: loads everything, the general corpus included, and swaps it in."""
+        started = time.perf_counter()
+        try:
+            self.load_corpora()
+        except Exception:
+            self.general_state = "failed"
+            logger.exception("Error loading the general corpus. Guesses it would answer stay degraded.")
+            return
+        if self.general_state == "failed":
+            return
+        logger.info("General corpus loaded in the background in %.2fs.", time.perf_counter() - started,
+                    extra={"generation": self.knowledge.generation})
+
+    def _reload_safely(self):
+        try:
+            self.load_corpora()
+            logger.info("Corpora reloaded (generation %d).", self.knowledge.generation,
+                        extra={"generation": self.knowledge.generation})
+        except Exception:
+            logger.exception("Error reloading corpora, keeping the current ones.")
+
+    def _prewarm(self, new_corpus, old_corpus):
+        """Builds the engine structures of the new index for every bucket the old one had warmed up."""
+        for shape in old_corpus.derived_shapes():
+            if new_corpus.bucket(shape):
+                self.engine.prepare(new_corpus, shape)
+
+    def _build_combined_index(self, airlines_corpus, general_corpus):
+        """Merges both corpora into one WeightedCorpusIndex with the configured source weights."""
+        started = time.perf_counter()
+        prior = occurrence_prior(airlines_corpus) if self.frequency_prior else None
+        index = WeightedCorpusIndex(((airlines_corpus, self.tier_weights["airlines"]),
+                                     (general_corpus, self.tier_weights["general"])), name="combined", prior=prior)
+        logger.info("Merged %d entries into the weighted index in %.2fs.", len(index), time.perf_counter() - started,
+                    extra={"entries": len(index)})
+        return index
+
+    def _load_index(self, file_path, name):
+        """
+        Loads one corpus as a CorpusIndex, memory-mapping its binary version when that is
+        enabled and up to date, and parsing the text file otherwise.
+        """
+        if self.use_binary and corpus_store.is_fresh(file_path):
+            bin_path = corpus_store.binary_path(file_path)
+            try:
+                index = corpus_store.load_binary_corpus(bin_path, name=name)
+                logger.info("Successfully mapped %d words from %s.", len(index), bin_path,
+                            extra={"path": bin_path, "entries": len(index)})
+                return index
+            except Exception:
+                logger.exception("Error mapping binary corpus from %s.", bin_path, extra={"path": bin_path})
+        return self._load_corpus(file_path, name)
 
-    def _load_corpus(self, file_path):
-        """Helper function to load a word list from a file."""
+    def _load_corpus(self, file_path, name):
+        """
+        Helper function to load a word list from a file into a CorpusIndex. The lines are
+        streamed into the index's packed buckets, so the file is never held in memory as
+        one str object per word.
+        """
         if not os.path.exists(file_path):
-            print(f"Warning: Corpus file not found at '{file_path}'")
-            return []
+            logger.warning("Corpus file not found at '%s'.", file_path, extra={"path": file_path})
+            return CorpusIndex([], name=name)
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
                 # Read words and strip any leading/trailing whitespace.
-                words = [line.strip() for line in f if line.strip()]
-                print(f"Successfully loaded {len(words)} words from {file_path}.")
-                return words
-        except Exception as e:
-            print(f"Error loading corpus from {file_path}: {e}")
-            return []
+                index = CorpusIndex((line.strip() for line in f if line.strip()), name=name)
+            logger.info("Successfully loaded %d words from %s.", len(index), file_path,
+                        extra={"path": file_path, "entries": len(index)})
+            return index
+        except Exception:
+            logger.exception("Error loading corpus from %s.", file_path, extra={"path": file_path})
+            return CorpusIndex([], name=name)
+
+    def _load_openings(self, data_dir):
+        """
+        Loads the opening table built by build_artifacts.py, together with the strategy
+        it was computed for. The table is ignored if it is missing or was built from
+        different corpora.
+        """
+        file_path = os.path.join(data_dir, "openings.json")
+        if not os.path.exists(file_path):
+            return {}, None
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                table = json.load(f)
+        except Exception:
+            logger.exception("Error loading opening table from %s.", file_path, extra={"path": file_path})
+            return {}, None
+        if table.get("fingerprint") != corpora_fingerprint(data_dir):
+            logger.warning("Opening table at '%s' is out of date with the corpora. Ignoring it.", file_path,
+                           extra={"path": file_path})
+            return {}, None
+        logger.info("Successfully loaded %d opening moves from %s.", len(table['openings']), file_path,
+                    extra={"path": file_path, "entries": len(table['openings'])})
+        return table["openings"], table.get("strategy", "frequency")
 
-    def make_guess(self, current_word_state, guessed_letters):
+    def _load_letter_model(self, airlines_corpus, general_corpus):
+        """
+        Loads the fallback letter model built by build_artifacts.py, or trains it from the
+        loaded corpora if it is missing or was built from different corpora.
+        """
+        file_path = os.path.join(self.data_dir, LETTER_MODEL_FILE)
+        try:
+            model = LetterModel.load(file_path, corpora_fingerprint(self.data_dir))
+        except Exception:
+            logger.exception("Error loading letter model from %s.", file_path, extra={"path": file_path})
+            model = None
+        if model is not None:
+            logger.info("Successfully loaded the letter model from %s.", file_path, extra={"path": file_path})
+            return model
+        logger.info("No up-to-date letter model at '%s'. Training it from the corpora "
+                    "(run build_artifacts.py to skip this).", file_path, extra={"path": file_path})
+        return LetterModel.train(entry for corpus in (airlines_corpus, general_corpus) for entry in corpus)
+
+    def make_guess(self, current_word_state, guessed_letters, session=None, strategy=None, info=None):
         """
         Makes an intelligent guess based on the current state of the game.
 
         Args:
             current_word_state (str): The current word state.
             guessed_letters (list): A list of letters that have already been guessed.
+            session (GameSession, optional): The game's session. When given, each corpus
+                is only filtered down from the candidates that survived the previous guess.
+            strategy (str, optional): Letter scoring strategy for this guess only (see
+                scorers.SCORERS). Defaults to the instance's strategy.
+            info (dict, optional): Receives the name of the tier that computed the guess,
+                as 'tier' (for a cached guess, the tier that computed it first).
 
         Returns:
             str: The single best letter to guess next.
         """
+        started = time.perf_counter()
+        scorer = self.scorer if strategy is None else create_scorer(strategy)
+        knowledge = self.knowledge
+        if session is not None:
+            session.sync(state_shape(current_word_state), guessed_letters, knowledge.generation)
+
+        # Tier 0: Early turns are answered straight from the precomputed opening table,
+        # and states that were seen recently from the guess cache. Cache keys carry the
+        # snapshot generation, so a guess computed on old corpora is never served later.
+        key = state_key(current_word_state, guessed_letters)
+        best_guess = knowledge.openings.get(key) if scorer.name == knowledge.openings_strategy else None
+        tier = source_tier = "openings"
+        cache_key = (knowledge.generation, scorer.name, key)
+        if not best_guess:
+            # The cache keeps the tier that computed each guess along with it.
+            best_guess, source_tier = self.cache.get(cache_key) or (None, None)
+            tier = "cache"
+        self.metrics.observe_stage("lookup", tier, time.perf_counter() - started)
+
+        if not best_guess:
+            best_guess, tier = self._make_fresh_guess(knowledge, current_word_state, guessed_letters, session, scorer)
+            source_tier = tier
+            self.cache.put(cache_key, (best_guess, tier))
+        if info is not None:
+            info["tier"] = source_tier
+        elapsed = time.perf_counter() - started
+        self.metrics.observe_guess(tier, elapsed)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Guessed '%s' for '%s'.", best_guess, key,
+                         extra={"tier": tier, "strategy": scorer.name, "seconds": elapsed})
+        return best_guess
+
+    def make_guesses(self, games, strategy=None, info=None):
+        """
+        Makes one guess for each of many concurrent games.
+
+        Games in the same state share a single computation. Games in different states
+        are guessed one by one; what they share is the per-bucket engine structures and
+        the guess cache, as with make_guess.
+
+        Args:
+            games (list): (current_word_state, guessed_letters) pairs.
+            strategy (str, optional): Letter scoring strategy for all the guesses.
+            info (dict, optional): Receives the tier of each guess (see make_guess), in
+                the same order as `games`, as 'tiers'.
+
+        Returns:
+            list: The guesses, in the same order as `games`.
+        """
+        same_state = {}
+        for i, (current_word_state, guessed_letters) in enumerate(games):
+            same_state.setdefault(state_key(current_word_state, guessed_letters), []).append(i)
+
+        guesses = [None] * len(games)
+        tiers = [None] * len(games)
+        guess_info = {}
+        for indices in same_state.values():
+            current_word_state, guessed_letters = games[indices[0]]
+            guess = self.make_guess(current_word_state, guessed_letters, strategy=strategy, info=guess_info)
+            for i in indices:
+                guesses[i] = guess
+                tiers[i] = guess_info["tier"]
+        if info is not None:
+            info["tiers"] = tiers
+        return guesses
+
+    def _make_fresh_guess(self, knowledge, current_word_state, guessed_letters, session, scorer):
+        """
+        Computes a guess through the corpus tiers, without consulting any table or cache.
+        Returns the guess and the name of the tier that made it.
+        """
+        if not knowledge.complete:
+            # Lazy start: until the general corpus is loaded, a mask the airline tier cannot
+            # answer gets the last-resort guess right away instead of waiting for it.
+            best_guess = self._get_best_guess_from_corpus(knowledge.airlines_corpus, current_word_state,
+                                                          guessed_letters, session, scorer)
+            if best_guess:
+                return best_guess, "airlines"
+            return self._get_last_resort_guess(knowledge, current_word_state, guessed_letters)[0], "degraded"
+
+        if knowledge.combined_corpus is not None:
+            # Tiers 1 and 2 in one pass: both corpora, with airline entries weighted up.
+            best_guess = self._get_best_guess_from_corpus(knowledge.combined_corpus, current_word_state,
+                                                          guessed_letters, session, scorer)
+            if best_guess:
+                return best_guess, "combined"
+            return self._get_last_resort_guess(knowledge, current_word_state, guessed_letters)
+
         # Tier 1: Try to find a guess using the specialized Airlines corpus.
-        best_guess = self._get_best_guess_from_corpus(self.airlines_corpus, current_word_state, guessed_letters)
+        best_guess = self._get_best_guess_from_corpus(knowledge.airlines_corpus, current_word_state, guessed_letters,
+                                                      session, scorer)
         if best_guess:
-            return best_guess
+            return best_guess, "airlines"
 
         # Tier 2: If Tier 1 fails, fall back to the general English corpus.
-        best_guess = self._get_best_guess_from_corpus(self.general_corpus, current_word_state, guessed_letters)
+        best_guess = self._get_best_guess_from_corpus(knowledge.general_corpus, current_word_state, guessed_letters,
+                                                      session, scorer)
         if best_guess:
-            return best_guess
+            return best_guess, "general"
+        return self._get_last_resort_guess(knowledge, current_word_state, guessed_letters)
+
+    def _get_last_resort_guess(self, knowledge, current_word_state, guessed_letters):
+        """Guesses for a mask that no corpus entry matches. Returns the guess and its tier."""
+        # Tier 3: A multi-word mask that matches no phrase is guessed word by word.
+        parts = split_word_state(current_word_state)
+        if self.phrase_model is not None and len(parts) > 1:
+            started = time.perf_counter()
+            best_guess = self.phrase_model.best_letter((knowledge.airlines_corpus, knowledge.general_corpus),
+                                                       knowledge.generation, parts, guessed_letters,
+                                                       knowledge.phrase_bigrams)
+            self.metrics.observe_stage("score", "phrase", time.perf_counter() - started)
+            if best_guess:
+                return best_guess, "phrase"
 
-        # Tier 3: If both corpora fail, use the simple letter frequency fallback.
-        return self._get_fallback_guess(guessed_letters)
+        # Tier 4: If nothing else matches, predict the letters of the blanks from their neighbours.
+        started = time.perf_counter()
+        best_guess = self._get_fallback_guess(current_word_state, guessed_letters, knowledge.letter_model)
+        self.metrics.observe_stage("fallback", "fallback", time.perf_counter() - started)
+        return best_guess, "fallback"
 
-    def _get_best_guess_from_corpus(self, corpus, current_word_state, guessed_letters):
+    def _get_best_guess_from_corpus(self, corpus, current_word_state, guessed_letters, session=None, scorer=None):
         """
         Filters a corpus to find candidate words and returns the best letter to guess.
         This is the core probabilistic reduction algorithm.
         """
-        
-        
-        word_components = re.split(r'\s{2,}', current_word_state)
-        
-        regex_parts = []
-        for component in word_components:
-            part_pattern = component.replace(' ', '').replace('_', '.')
-            regex_parts.append(part_pattern)
-            
-        final_pattern = r'\s+'.join(regex_parts)
-        
-        try:
-            # Compile the regex for an exact match from start to end.
-            regex = re.compile(f"^{final_pattern}$")
-        except re.error as e:
-            print(f"Error compiling regex: {final_pattern} -> {e}")
-            return None # Cannot proceed if the pattern is invalid
-
-        # Filter the corpus using the generated regex to find all possible candidates.
-        candidate_words = [word for word in corpus if regex.match(word)]
+        parts = split_word_state(current_word_state)
+        shape = tuple(len(part) for part in parts)
 
-        if not candidate_words:
+        # Only entries with the same per-word lengths as the mask can match it.
+        bucket = corpus.bucket(shape)
+        if not bucket:
             return None # No candidates found
 
-        # Frequency Analysis on Candidate Words
-        all_letters_in_candidates = "".join(candidate_words)
-        letter_counts = Counter(all_letters_in_candidates)
-
-        # Remove letters that have already been guessed.
-        for letter in guessed_letters:
-            if letter in letter_counts:
-                del letter_counts[letter]
-        
-        # Also remove spaces from the potential guesses.
-        if ' ' in letter_counts:
-            del letter_counts[' ']
-
-        # If there are any valid letters left, return the most common one.
-        if letter_counts:
-            return letter_counts.most_common(1)[0][0]
+        # Filter the matching bucket with the configured engine to find all possible candidates.
+        # Within a session, only the survivors of the previous guess need to be checked.
+        previous_ids = session.candidates.get(corpus.name) if session is not None else None
+        started = time.perf_counter()
+        candidate_ids = self.engine.candidate_ids(corpus, shape, parts, guessed_letters, within=previous_ids)
+        self.metrics.observe_stage("filter", corpus.name, time.perf_counter() - started)
+        if candidate_ids is None:
+            return None # Cannot proceed if the pattern is invalid
+        if session is not None:
+            session.candidates[corpus.name] = self.engine.session_candidates(candidate_ids)
+        self.metrics.observe_candidates(corpus.name, len(candidate_ids))
+        if len(candidate_ids) == 0:
+            return None # No candidates found
 
-        return None
+        # Score the letters over the candidate words with the chosen strategy.
+        scorer = scorer or self.scorer
+        started = time.perf_counter()
+        best_guess = scorer.choose(self.engine, corpus, shape, candidate_ids, guessed_letters,
+                                   weighted=isinstance(corpus, WeightedCorpusIndex))
+        self.metrics.observe_stage("score", corpus.name, time.perf_counter() - started)
+        return best_guess
 
-    def _get_fallback_guess(self, guessed_letters):
+    def _get_fallback_guess(self, current_word_state, guessed_letters, letter_model=None):
         """
-        Provides a simple fallback guess based on general English letter frequency
-        if no candidates are found in any corpus.
+        Provides a fallback guess if no candidates are found in any corpus: the letter
+        the letter model rates most likely to fill a blank, given the revealed letters
+        around the blanks, or otherwise the next letter by general English frequency.
         """
+        if letter_model is not None:
+            best_guess = letter_model.best_letter(split_word_state(current_word_state), guessed_letters)
+            if best_guess:
+                return best_guess
+
         for letter in self.fallback_letters:
             if letter not in guessed_letters:
                 return letter
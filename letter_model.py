@@ -0,0 +1,171 @@
+"""
+An offline letter model for the last-resort tier, when no corpus entry matches the mask.
+
+It is trained once from the words of both corpora and predicts the letter at a blank
+from what is known around it: the revealed letters (or word boundaries) on either
+side, and the blank's position within a word of that length. A guess only looks up
+a few small probability tables per blank, with no corpus scan.
+"""
+import json
+import os
+from collections import Counter
+from functools import lru_cache
+from itertools import repeat
+
+from scorers import ENGLISH_LETTER_ORDER
+
+# File name of the trained model inside the data directory (built by build_artifacts.py).
+LETTER_MODEL_FILE = "letter_model.json"
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+# Marks the start and the end of a word in the neighbour contexts.
+BOUNDARY = "^"
+# Word lengths beyond this share one positional table.
+MAX_LENGTH = 20
+
+# Interpolation weights of the component models: both neighbours, one neighbour,
+# position in a word of this length, and plain letter frequency.
+BOTH_WEIGHT = 0.5
+NEIGHBOUR_WEIGHT = 0.3
+POSITION_WEIGHT = 0.15
+UNIGRAM_WEIGHT = 0.05
+
+
+def _normalize(counts):
+    total = sum(counts)
+    return [count / total for count in counts] if total else None
+
+
+class LetterModel:
+    """
+    Letter counts by context, kept as 26-entry rows:
+
+    both       (left, right) neighbours -> letter counts
+    left       left neighbour -> letter counts
+    right      right neighbour -> letter counts
+    position   "length:position" -> letter counts
+    unigram    letter counts
+
+    Neighbours are letters or BOUNDARY. Rows are turned into probabilities once, at load.
+    """
+
+    def __init__(self, tables):
+        self.tables = tables
+        self._both = {key: _normalize(row) for key, row in tables["both"].items()}
+        self._left = {key: _normalize(row) for key, row in tables["left"].items()}
+        self._right = {key: _normalize(row) for key, row in tables["right"].items()}
+        self._position = {key: _normalize(row) for key, row in tables["position"].items()}
+        self._unigram = _normalize(tables["unigram"]) or [1 / 26] * 26
+        # Games keep asking about the same few contexts, so their mixtures are memoized.
+        self.blank_distribution = lru_cache(maxsize=4096)(self._blank_distribution)
+
+    @classmethod
+    def train(cls, entries):
+        """Counts the letter contexts of every word of every entry."""
+        # (before, letter, after) and (length, position, letter) triples, counted at C speed.
+        trigrams, positions = Counter(), Counter()
+        for entry in entries:
+            for word in entry.split():
+                padded = BOUNDARY + word + BOUNDARY
+                trigrams.update(zip(padded, word, padded[2:]))
+                positions.update(zip(repeat(min(len(word), MAX_LENGTH)), range(MAX_LENGTH), word))
+                if len(word) > MAX_LENGTH:
+                    positions.update(zip(repeat(MAX_LENGTH), repeat(MAX_LENGTH - 1), word[MAX_LENGTH:]))
+
+        both, left, right, position = {}, {}, {}, {}
+        unigram = [0] * 26
+
+        def add(table, key, code, count):
+            row = table.get(key)
+            if row is None:
+                row = table[key] = [0] * 26
+            row[code] += count
+
+        for (before, letter, after), count in trigrams.items():
+            code = ord(letter) - 97
+            if 0 <= code < 26:
+                add(both, before + after, code, count)
+                add(left, before, code, count)
+                add(right, after, code, count)
+                unigram[code] += count
+        for (length, index, letter), count in positions.items():
+            code = ord(letter) - 97
+            if 0 <= code < 26:
+                add(position, f"{length}:{index}", code, count)
+        return cls({"both": both, "left": left, "right": right, "position": position, "unigram": unigram})
+
+    def save(self, path, fingerprint):
+        """Writes the count tables with the fingerprint of the corpora they were trained on."""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"fingerprint": fingerprint, "tables": self.tables}, f, separators=(",", ":"))
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        """Loads a saved model, or returns None if it is missing or was trained on other corpora."""
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+        if saved.get("fingerprint") != fingerprint:
+            return None
+        return cls(saved["tables"])
+
+    def _blank_distribution(self, before, after, length, index):
+        """
+        Returns the probability of each letter at a blank, mixing the tables that apply.
+        `before` and `after` are the neighbours, or None when the neighbour is a blank.
+        """
+        components = []
+        if before is not None and after is not None:
+            components.append((BOTH_WEIGHT, self._both.get(before + after)))
+        if before is not None:
+            components.append((NEIGHBOUR_WEIGHT, self._left.get(before)))
+        if after is not None:
+            components.append((NEIGHBOUR_WEIGHT, self._right.get(after)))
+        components.append((POSITION_WEIGHT, self._position.get(f"{min(length, MAX_LENGTH)}:{min(index, MAX_LENGTH - 1)}")))
+        components.append((UNIGRAM_WEIGHT, self._unigram))
+
+        distribution = [0.0] * 26
+        total_weight = 0.0
+        for weight, row in components:
+            if row is None:
+                continue
+            total_weight += weight
+            for code, probability in enumerate(row):
+                distribution[code] += weight * probability
+        return tuple(probability / total_weight for probability in distribution)
+
+    def best_letter(self, parts, guessed_letters):
+        """
+        Returns the letter most likely to appear in at least one blank of the mask (one
+        pattern per word, as from corpus_index.split_word_state), or None if every
+        letter has been guessed. Guessed and revealed letters are never picked; revealed
+        letters cannot sit in a blank either, so they are taken out of each blank's
+        distribution before it is renormalized.
+        """
+        excluded = set(guessed_letters)
+        for part in parts:
+            excluded.update(char for char in part if char != '_')
+        allowed = [code for code in range(26) if LETTERS[code] not in excluded]
+        if not allowed:
+            return None
+
+        # The probability that each letter is absent from every blank.
+        absent = [1.0] * 26
+        for part in parts:
+            padded = BOUNDARY + part + BOUNDARY
+            for index, char in enumerate(part):
+                if char != '_':
+                    continue
+                before, after = padded[index], padded[index + 2]
+                distribution = self.blank_distribution(None if before == '_' else before,
+                                                       None if after == '_' else after, len(part), index)
+                total = sum(distribution[code] for code in allowed)
+                if not total:
+                    continue
+                for code in allowed:
+                    absent[code] *= 1 - distribution[code] / total
+
+        # Ties go to the more frequent English letter.
+        return min((absent[ord(letter) - 97], rank, letter) for rank, letter in enumerate(ENGLISH_LETTER_ORDER)
+                   if ord(letter) - 97 in allowed)[2]
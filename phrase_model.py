@@ -0,0 +1,187 @@
+"""
+Guessing multi-word masks one word at a time.
+
+The corpus tiers only match phrases that exist verbatim in a corpus, so a new
+combination of known words finds no candidates at all. The phrase model instead
+looks each word of the mask up on its own, among the single-word entries of the
+same length, and combines the letter distributions of the words. Adjacent word
+pairs seen in the airline phrases can optionally weight the candidates of each word
+towards the words that usually stand next to its neighbours' candidates.
+"""
+from collections import Counter
+
+from filter_engines import bucket_letter_masks
+from guess_cache import GuessCache
+from scorers import ENGLISH_LETTER_ORDER
+
+# How much one occurrence of a candidate pair in the corpus phrases adds to the weight
+# of a candidate word, which is 1 without any pair.
+BIGRAM_WEIGHT = 2
+
+
+def word_bigrams(entries):
+    """
+    Counts the adjacent word pairs of the multi-word entries. Returns two dicts of
+    dicts: the words that follow each word, and the words that precede it, with counts.
+    """
+    pairs = Counter()
+    for entry in entries:
+        words = entry.split()
+        if len(words) > 1:
+            pairs.update(zip(words, words[1:]))
+
+    followers, leaders = {}, {}
+    for (first, second), count in pairs.items():
+        followers.setdefault(first, {})[second] = count
+        leaders.setdefault(second, {})[first] = count
+    return followers, leaders
+
+
+class WordCandidates:
+    """The single-word candidates of one word of a mask, in the first corpus that has any."""
+    __slots__ = ("corpus", "shape", "ids", "words")
+
+    def __init__(self, corpus, shape, ids):
+        self.corpus = corpus
+        self.shape = shape
+        self.ids = ids
+        self.words = None
+
+    def word_set(self):
+        """Returns the candidate words as a set, built the first time it is needed."""
+        if self.words is None:
+            bucket = self.corpus.bucket(self.shape)
+            self.words = {bucket[word_id] for word_id in self.ids}
+        return self.words
+
+
+class PhraseModel:
+    """
+    Picks the letter most likely to appear in at least one word of a multi-word mask.
+
+    Each word is filtered on its own, and its candidates are cached by word pattern and
+    guessed letters, so a word costs the same wherever it appears in a phrase and a
+    phrase costs no more than its words. Within a word, the probability of a letter is
+    the (weighted) share of candidates that contain it.
+    """
+
+    def __init__(self, engine, cache_size=10000, use_bigrams=True):
+        self.engine = engine
+        self.use_bigrams = use_bigrams
+        self.cache = GuessCache(maxsize=cache_size)
+
+    def word_candidates(self, corpora, generation, part, guessed_letters):
+        """
+        Returns the WordCandidates of one word pattern, from the first of `corpora` whose
+        single-word entries match it, or None if no corpus has a match.
+        """
+        key = (generation, part, "".join(sorted(set(guessed_letters))))
+        candidates = self.cache.get(key)
+        if candidates is not None:
+            return candidates or None
+
+        shape = (len(part),)
+        candidates = False
+        for corpus in corpora:
+            if not corpus.bucket(shape):
+                continue
+            ids = self.engine.candidate_ids(corpus, shape, [part], guessed_letters)
+            if ids is not None and len(ids):
+                candidates = WordCandidates(corpus, shape, ids)
+                break
+        # A miss is cached too, as False, so unknown words are not filtered again.
+        self.cache.put(key, candidates)
+        return candidates or None
+
+    def best_letter(self, corpora, generation, parts, guessed_letters, bigrams=None):
+        """
+        Returns the best letter for a multi-word mask (one pattern per word), or None if
+        no word with blanks has any candidate. `bigrams` are the tables of word_bigrams,
+        used to weight the candidates when the model uses them.
+        """
+        words = [self.word_candidates(corpora, generation, part, guessed_letters) if '_' in part else None
+                 for part in parts]
+        if not any(words):
+            return None
+
+        guessed = set(guessed_letters)
+        # The probability that each letter is absent from every word.
+        absent = [1.0] * 26
+        for index, candidates in enumerate(words):
+            if candidates is None:
+                continue
+            weights = None
+            if self.use_bigrams and bigrams is not None:
+                before = self._neighbour_words(parts, words, index - 1)
+                after = self._neighbour_words(parts, words, index + 1)
+                weights = self._bigram_weights(candidates, before, after, bigrams)
+            presence, total = self._letter_weights(candidates, weights)
+            for code in range(26):
+                absent[code] *= 1 - presence[code] / total
+
+        allowed = [(absent[ord(letter) - 97], rank, letter) for rank, letter in enumerate(ENGLISH_LETTER_ORDER)
+                   if letter not in guessed]
+        if not allowed or min(allowed)[0] == 1.0:
+            return None  # No candidate holds a letter that is still open.
+        # Ties go to the more frequent English letter.
+        return min(allowed)[2]
+
+    def _letter_weights(self, candidates, weights):
+        """
+        Returns, for each letter a-z, the total weight of the candidates that contain it,
+        and the total weight of all candidates (their count when unweighted).
+        """
+        if weights is None:
+            return self.engine.letter_presence(candidates.corpus, candidates.shape, candidates.ids), len(candidates.ids)
+
+        masks = bucket_letter_masks(candidates.corpus, candidates.shape)
+        mask_weights = Counter()
+        for word_id, weight in zip(candidates.ids, weights):
+            mask_weights[masks[word_id]] += weight
+        presence = [0] * 26
+        for mask, weight in mask_weights.items():
+            while mask:
+                lowest = mask & -mask
+                presence[lowest.bit_length() - 1] += weight
+                mask ^= lowest
+        return presence, sum(weights)
+
+    @staticmethod
+    def _neighbour_words(parts, words, index):
+        """
+        Returns the words the word at `index` may be: itself once it is fully revealed,
+        its candidates otherwise, or None if it is out of range or has no candidates.
+        """
+        if not 0 <= index < len(parts):
+            return None
+        if '_' not in parts[index]:
+            return {parts[index]}
+        return words[index].word_set() if words[index] is not None else None
+
+    @staticmethod
+    def _bigram_weights(candidates, before, after, bigrams):
+        """
+        Returns the weight of each candidate: 1, plus BIGRAM_WEIGHT for every time it
+        follows one of the words `before` or precedes one of the words `after` in the
+        corpus phrases. Returns None when no candidate pair occurs at all.
+        """
+        followers, leaders = bigrams
+        bucket = candidates.corpus.bucket(candidates.shape)
+        neighbours = []
+        if before is not None:
+            neighbours.append((leaders, before))
+        if after is not None:
+            neighbours.append((followers, after))
+        if not neighbours:
+            return None
+
+        weights, paired = [], False
+        for word_id in candidates.ids:
+            pairs = 0
+            for table, neighbour_words in neighbours:
+                for neighbour, count in table.get(bucket[word_id], {}).items():
+                    if neighbour in neighbour_words:
+                        pairs += count
+            paired = paired or pairs > 0
+            weights.append(1 + BIGRAM_WEIGHT * pairs)
+        return weights if paired else None
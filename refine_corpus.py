@@ -1,5 +1,13 @@
-import re
+import argparse
+import heapq
+import logging
 import os
+import string
+import tempfile
+from itertools import islice
+from structured_logging import configure_logging
+
+logger = logging.getLogger("refine_corpus")
 
 # --- Configuration ---
 DATA_DIR = "data"
@@ -10,6 +18,12 @@ OUTPUT_FILE = os.path.join(DATA_DIR, "airlines_corpus.txt")
 MAX_WORD_LENGTH = 25
 MIN_AVG_PHRASE_LENGTH = 2.5
 
+# Entries sorted in memory at a time; larger inputs are sorted in runs on disk and merged.
+SORT_RUN_SIZE = 500000
+
+# Deletes the lowercase letters, so what is left of a valid entry is only spaces.
+_DELETE_LETTERS = str.maketrans('', '', string.ascii_lowercase)
+
 WHITELIST = {
     "hub", "roll", "pitch", "go first", "leh", "neo","vor", "ils", "gps", "pax", "ramp", "tow", "apu", "mel", "vfr", "ifr",
     "atc", "jet", "suv", "yaw", "fin", "rib", "spar", "lift", "drag",
@@ -68,82 +82,170 @@ STOP_WORDS = {
 }
 
 
-def refine_corpus():
+def read_entries(path, lowercase=False):
+    """Yields the stripped, non-empty lines of a source file, lowercased if asked."""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            entry = line.strip()
+            if entry:
+                yield entry.lower() if lowercase else entry
+
+
+def is_clean(entry):
     """
-    Reads raw corpora, cleans them, combines with additional word lists,
-    and overwrites the main corpus file with the refined version.
+    Rule 1: Basic junk filter (must only contain letters and spaces). Same as matching
+    ^[a-z ]+$, but done by deleting the letters with str.translate and checking that
+    only spaces are left. Other whitespace (tabs, NBSP) is rejected too: the binary
+    corpora store ASCII entries, and game masks only separate words with spaces.
     """
-    print("Starting corpus refinement...")
+    rest = entry.translate(_DELETE_LETTERS)
+    return not rest.strip(' ')
+
 
-    raw_corpus = set()
-    additional_words = set()
+def keep_entry(entry):
+    """Applies the refinement rules to one raw entry."""
+    if not is_clean(entry):
+        return False
 
-    # Load the primary raw corpus generated by the scraper
+    words = entry.split()
+
+    # Rule 2: "Alphabet Soup" Filter
+    if len(words) > 1:
+        avg_len = sum(len(word) for word in words) / len(words)
+        if avg_len < MIN_AVG_PHRASE_LENGTH:
+            return False
+
+    # Rule 3: Gibberish Filter (unnaturally long words)
+    if any(len(word) > MAX_WORD_LENGTH for word in words):
+        return False
+
+    # Rule 4: Final Decision Logic (Trust the source, filter stop words)
+    return len(words) > 1 or entry not in STOP_WORDS
+
+
+def external_sort_unique(entries, temp_dir, run_size=SORT_RUN_SIZE):
+    """
+    Yields the distinct entries in sorted order, holding at most `run_size` of them in
+    memory: each run is sorted and written to a temporary file, and the runs are then
+    merged, dropping duplicates.
+    """
+    entries = iter(entries)
+    run_files = []
     try:
-        with open(AIRLINES_CORPUS_FILE, 'r', encoding='utf-8') as f:
-            raw_corpus = {line.strip() for line in f if line.strip()}
-        print(f"Loaded {len(raw_corpus)} raw entries from '{os.path.basename(AIRLINES_CORPUS_FILE)}'.")
-    except FileNotFoundError:
-        print(f"Warning: '{os.path.basename(AIRLINES_CORPUS_FILE)}' not found. It will be created from other sources.")
-    except Exception as e:
-        print(f"Error loading '{os.path.basename(AIRLINES_CORPUS_FILE)}': {e}")
-
-    # Load the additional words from the new data file
+        while True:
+            run = sorted(set(islice(entries, run_size)))
+            if not run:
+                break
+            run_file = tempfile.TemporaryFile('w+', encoding='utf-8', dir=temp_dir)
+            run_file.writelines(f"{entry}\n" for entry in run)
+            run_file.seek(0)
+            run_files.append(run_file)
+
+        # The runs are merged on the entries themselves, not on the lines: an entry may hold
+        # characters that sort before the newline.
+        previous = None
+        for entry in heapq.merge(*((line[:-1] for line in run_file) for run_file in run_files)):
+            if entry != previous:
+                yield entry
+                previous = entry
+    finally:
+        for run_file in run_files:
+            run_file.close()
+
+
+def write_atomically(lines, output_path):
+    """
+    Writes the lines to a new temporary file next to `output_path` and renames it over
+    the output only once it is complete, so readers (and a crash) never see a partial
+    corpus, and the output may safely be one of the inputs. Returns the number of lines.
+    """
+    directory = os.path.dirname(os.path.abspath(output_path))
+    descriptor, temp_path = tempfile.mkstemp(prefix=".refine-", suffix=".tmp", dir=directory)
+    count = 0
     try:
-        # Ensure the 'data' directory exists before trying to read from it
-        os.makedirs(os.path.dirname(ADDITIONAL_WORDS_FILE), exist_ok=True)
-        with open(ADDITIONAL_WORDS_FILE, 'r', encoding='utf-8') as f:
-            additional_words = {line.strip().lower() for line in f if line.strip()}
-        print(f"Loaded {len(additional_words)} additional words from '{os.path.basename(ADDITIONAL_WORDS_FILE)}'.")
-    except FileNotFoundError:
-        print(f"Info: Additional words file '{os.path.basename(ADDITIONAL_WORDS_FILE)}' not found. Skipping.")
-    except Exception as e:
-        print(f"Error loading '{os.path.basename(ADDITIONAL_WORDS_FILE)}': {e}")
-
-    # Combine all sources into one large set to process
-    full_raw_corpus = raw_corpus.union(additional_words)
-
-    # Start with our guaranteed VIP words from the whitelist
-    refined_corpus = set(WHITELIST)
-
-    for entry in full_raw_corpus:
-        # Rule 1: Basic junk filter (must only contain letters and spaces)
-        if not re.match(r'^[a-z\s]+$', entry):
-            continue
-
-        words = entry.split()
-
-        # Rule 2: "Alphabet Soup" Filter
-        if len(words) > 1:
-            avg_len = sum(len(word) for word in words) / len(words)
-            if avg_len < MIN_AVG_PHRASE_LENGTH:
-                continue
-
-        # Rule 3: Gibberish Filter (unnaturally long words)
-        if any(len(word) > MAX_WORD_LENGTH for word in words):
-            continue
-
-        # Rule 4: Final Decision Logic (Trust the source, filter stop words)
-        if len(words) == 1:
-            if entry not in STOP_WORDS:
-                refined_corpus.add(entry)
-        else:
-            refined_corpus.add(entry)
-
-    print(f"Refined corpus down to {len(refined_corpus)} high-quality entries.")
-
-    # Sort the final list for consistency
-    sorted_refined_corpus = sorted(list(refined_corpus))
+        with os.fdopen(descriptor, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(f"{line}\n")
+                count += 1
+        os.replace(temp_path, output_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return count
+
+
+def refine_corpus(raw_file=AIRLINES_CORPUS_FILE, additional_file=ADDITIONAL_WORDS_FILE, output_file=OUTPUT_FILE,
+                  run_size=SORT_RUN_SIZE):
+    """
+    Reads raw corpora, cleans them, combines with additional word lists,
+    and writes the refined, sorted version to `output_file` (by default the main
+    corpus file, which is replaced atomically).
 
+    The sources are streamed: entries flow through the filters one at a time and are
+    sorted with an external merge sort, so sources larger than memory can be refined.
+    """
+    logger.info("Starting corpus refinement...")
+
+    def sources():
+        # Start with our guaranteed VIP words from the whitelist
+        yield from WHITELIST
+        for path, lowercase in ((raw_file, False), (additional_file, True)):
+            try:
+                count = 0
+                for entry in read_entries(path, lowercase=lowercase):
+                    count += 1
+                    if keep_entry(entry):
+                        yield entry
+                logger.info("Read %d entries from '%s'.", count, os.path.basename(path),
+                            extra={"path": path, "entries": count})
+            except FileNotFoundError:
+                logger.warning("'%s' not found. Skipping it.", os.path.basename(path), extra={"path": path})
+
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    os.makedirs(output_dir, exist_ok=True)
     try:
-        with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
-            for word in sorted_refined_corpus:
-                f.write(f"{word}\n")
-        print(f"Successfully saved the refined corpus to '{os.path.basename(OUTPUT_FILE)}'.")
+        count = write_atomically(external_sort_unique(sources(), output_dir, run_size=run_size), output_file)
     except IOError as e:
-        print(f"Error: Could not write to the output file. {e}")
+        logger.error("Could not write to the output file. %s", e)
+        return None
 
+    logger.info("Refined corpus down to %d high-quality entries, saved to '%s'.", count,
+                os.path.basename(output_file), extra={"entries": count, "path": output_file})
+    return output_file
+
+
+def refine_and_build(raw_file=AIRLINES_CORPUS_FILE, additional_file=ADDITIONAL_WORDS_FILE, output_file=OUTPUT_FILE,
+                     run_size=SORT_RUN_SIZE, artifacts=True, openings=True):
+    """
+    Refines the corpus, then rebuilds the artifacts that are fingerprinted against it
+    (binary corpora, letter model and, unless `openings` is false, the opening table),
+    so the server never falls back to stale or missing ones. Returns the output path,
+    or None if refinement failed.
+    """
+    output = refine_corpus(raw_file, additional_file, output_file, run_size=run_size)
+    if output and artifacts:
+        # One offline step produces everything the server loads from the data directory.
+        from build_artifacts import build_all
+        build_all(os.path.dirname(output_file) or ".", openings=openings)
+    return output
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Refines the raw airline corpus and builds the solver's artifacts.")
+    parser.add_argument("--raw", default=AIRLINES_CORPUS_FILE, help="Raw corpus produced by corpus_builder.py.")
+    parser.add_argument("--additional", default=ADDITIONAL_WORDS_FILE, help="Additional word list to merge in.")
+    parser.add_argument("--output", default=OUTPUT_FILE, help="Refined corpus to write (replaced atomically).")
+    parser.add_argument("--run-size", type=int, default=SORT_RUN_SIZE,
+                        help="Entries sorted in memory at a time before spilling a run to disk.")
+    parser.add_argument("--skip-artifacts", action="store_true",
+                        help="Only refine; do not rebuild the binary corpora and opening table.")
+    parser.add_argument("--skip-openings", action="store_true",
+                        help="Rebuild the binary corpora but not the (slower) opening table.")
+    return parser.parse_args()
 
-if __name__ == "__main__":
-    refine_corpus()
 
+if __name__ == "__main__":
+    configure_logging()
+    args = parse_args()
+    refine_and_build(args.raw, args.additional, args.output, run_size=args.run_size,
+                     artifacts=not args.skip_artifacts, openings=not args.skip_openings)
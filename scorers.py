@@ -0,0 +1,84 @@
+# English letters ordered by frequency, used to break ties between equally good letters.
+ENGLISH_LETTER_ORDER = "eariotnslcudpmhgbfywkvxzjq"
+
+
+def _best_by(keys, guessed_letters):
+    """
+    Returns the letter with the lowest sort key among those not guessed yet, or None.
+    `keys` holds one key per letter a-z, or None for letters that must not be picked.
+    """
+    guessed = set(guessed_letters)
+    best_letter, best_key = None, None
+    for letter in ENGLISH_LETTER_ORDER:
+        key = keys[ord(letter) - 97]
+        if key is None or letter in guessed:
+            continue
+        if best_key is None or key < best_key:
+            best_letter, best_key = letter, key
+    return best_letter
+
+
+class FrequencyScorer:
+    """
+    Picks the letter with the highest total number of occurrences over all candidates
+    (the original strategy). Ties go to the letter that appears first in the candidates,
+    or, over weighted candidates, to the more frequent English letter.
+
+    With `weighted`, every scorer counts each candidate as many times as its weight in
+    the corpus, which must then be a corpus_index.WeightedCorpusIndex.
+    """
+    name = "frequency"
+
+    def choose(self, engine, corpus, shape, candidate_ids, guessed_letters, weighted=False):
+        if weighted:
+            counts = engine.weighted_letter_counts(corpus, shape, candidate_ids)
+            return _best_by([-count if count else None for count in counts], guessed_letters)
+        return engine.best_letter(corpus, shape, candidate_ids, guessed_letters)
+
+
+class PresenceScorer:
+    """
+    Picks the letter contained in the most candidates, i.e. the one least likely to be
+    a miss. Unlike raw frequency, a word that repeats a letter only counts once.
+    """
+    name = "presence"
+
+    def choose(self, engine, corpus, shape, candidate_ids, guessed_letters, weighted=False):
+        if weighted:
+            presence = engine.weighted_letter_presence(corpus, shape, candidate_ids)
+        else:
+            presence = engine.letter_presence(corpus, shape, candidate_ids)
+        return _best_by([-count if count else None for count in presence], guessed_letters)
+
+
+class PartitionScorer:
+    """
+    Picks the letter that is expected to leave the fewest candidates: guessing a letter
+    splits the candidates into groups by where it would be revealed (or a miss), and
+    the expected size of the group we end up in is the sum of the squared group sizes
+    divided by the number of candidates. This is an information-gain strategy that
+    works on exact integers, so every engine makes the same choice. Ties go to the
+    letter that is less likely to be a miss.
+    """
+    name = "partition"
+
+    def choose(self, engine, corpus, shape, candidate_ids, guessed_letters, weighted=False):
+        if weighted:
+            presence = engine.weighted_letter_presence(corpus, shape, candidate_ids)
+            sizes = engine.weighted_partition_sizes(corpus, shape, candidate_ids)
+        else:
+            presence = engine.letter_presence(corpus, shape, candidate_ids)
+            sizes = engine.partition_sizes(corpus, shape, candidate_ids)
+        keys = [(size, -count) if count else None for size, count in zip(sizes, presence)]
+        return _best_by(keys, guessed_letters)
+
+
+SCORERS = {scorer.name: scorer for scorer in (FrequencyScorer, PresenceScorer, PartitionScorer)}
+
+
+def create_scorer(name):
+    """Returns a new letter scorer by name (see SCORERS)."""
+    try:
+        return SCORERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown guess strategy '{name}'. Choose one of: {', '.join(SCORERS)}") from None
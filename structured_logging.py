@@ -0,0 +1,149 @@
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import sys
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener
+
+# The id of the request being served, attached to every log record made while serving it.
+_request_id = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else on a record was passed through `extra`.
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+
+_queue_handler = None
+_listener = None
+
+
+def new_request_id():
+    return uuid.uuid4().hex
+
+
+def bind_request_id(request_id=None):
+    """
+    Tags the log records made from now on, in this thread or task, with a request id (a
+    new one if not given). Returns the id and a token for unbind_request_id.
+    """
+    request_id = request_id or new_request_id()
+    return request_id, _request_id.set(request_id)
+
+
+def unbind_request_id(token):
+    _request_id.reset(token)
+
+
+@contextlib.contextmanager
+def request_context(request_id=None):
+    """Tags the log records made inside the block with a request id (a new one if not given)."""
+    request_id, token = bind_request_id(request_id)
+    try:
+        yield request_id
+    finally:
+        unbind_request_id(token)
+
+
+def current_request_id():
+    return _request_id.get()
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request id, in the thread that made them."""
+
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as one JSON object per line, with its time, level, logger, message,
+    request id and every field passed through `extra`.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level=None, log_format=None, stream=None):
+    """
+    Sends the records of every logger to `stream` (stderr by default) through a queue, so
+    the thread that logs only enqueues the record and a background thread does the
+    formatting and writing. Safe to call more than once; only the first call configures.
+
+    Args:
+        level (str): Minimum level to log. Defaults to HANGMAN_LOG_LEVEL, or "INFO".
+        log_format (str): "json" (one JSON object per line) or "text". Defaults to
+            HANGMAN_LOG_FORMAT, or "json".
+        stream: Where the log lines are written.
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+    level = (level or os.environ.get("HANGMAN_LOG_LEVEL", "INFO")).upper()
+    log_format = log_format or os.environ.get("HANGMAN_LOG_FORMAT", "json")
+
+    handler = logging.StreamHandler(stream or sys.stderr)
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    _queue_handler = _RecordQueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(RequestIdFilter())
+    _listener = QueueListener(_queue_handler.queue, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+
+class _RecordQueueHandler(QueueHandler):
+    """
+    A QueueHandler that enqueues the record as is. The stock one formats the message in
+    the logging thread; here all formatting is left to the listener, and only records
+    with an exception are rendered early (a traceback cannot cross the queue later).
+    """
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _restart_after_fork():
+    # A forked child inherits the queue but not the listener thread, so it gets its own.
+    global _listener
+    if _listener is None:
+        return
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = QueueListener(_queue_handler.queue, *_listener.handlers)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+os.register_at_fork(after_in_child=_restart_after_fork)
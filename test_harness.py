@@ -1,11 +1,15 @@
+import argparse
 import requests
 import json
+import math
+import multiprocessing
 import time
 import os
 
 # The address of our running API server.
 API_URL = "http://127.0.0.1:5000/guess"
 TEST_WORDS_FILE = "words_to_test.txt"
+MAX_INCORRECT_GUESSES = 6
 
 def load_test_words(file_path):
     """
@@ -19,7 +23,7 @@ def load_test_words(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as f:
             words = [
-                line.strip() for line in f 
+                line.strip() for line in f
                 if line.strip() and not line.strip().startswith('#')
             ]
             return words
@@ -27,17 +31,40 @@ def load_test_words(file_path):
         print(f"Error reading from {file_path}: {e}")
         return []
 
-def play_game(secret_word):
+def http_guesser(current_word_state, guessed_letters, guesses_remaining):
+    """Asks the running API server for the next guess."""
+    payload = {
+        "currentWordState": current_word_state,
+        "guessedLetters": guessed_letters,
+        "guessesRemaining": guesses_remaining
+    }
+    response = requests.post(API_URL, json=payload, timeout=30)
+    response.raise_for_status()
+    return response.json()['nextGuess']
+
+def in_process_guesser(ai, strategy=None):
+    """Returns a guesser that calls HangmanAI.make_guess directly, with no server involved."""
+    def guess(current_word_state, guessed_letters, guesses_remaining):
+        return ai.make_guess(current_word_state, list(guessed_letters), strategy=strategy)
+    return guess
+
+def play_game(secret_word, guesser=http_guesser, verbose=True, delay=0.5):
     """
     Plays a single game of Hangman using the algo for a given secret word.
+
+    Returns:
+        tuple: (was_successful, incorrect_guesses, guess_latencies), where the latencies
+        are the seconds each call to the guesser took.
     """
-    print(f"\n--- Starting new game. Word to guess: {secret_word} ---")
-    
+    log = print if verbose else (lambda *args, **kwargs: None)
+    log(f"\n--- Starting new game. Word to guess: {secret_word} ---")
+
     secret_word_lower = secret_word.lower()
     guessed_letters = []
     incorrect_guesses = []
-    guesses_remaining = 6
-    
+    guess_latencies = []
+    guesses_remaining = MAX_INCORRECT_GUESSES
+
     word_state_list = []
     for char in secret_word_lower:
         if char == ' ':
@@ -47,28 +74,23 @@ def play_game(secret_word):
     current_word_state = "".join(word_state_list).strip()
 
     while guesses_remaining > 0:
-        payload = {
-            "currentWordState": current_word_state,
-            "guessedLetters": guessed_letters,
-            "guessesRemaining": guesses_remaining
-        }
-        
         try:
-            response = requests.post(API_URL, json=payload, timeout=30)
-            response.raise_for_status()
-            ai_guess = response.json()['nextGuess']
+            started = time.perf_counter()
+            ai_guess = guesser(current_word_state, guessed_letters, guesses_remaining)
+            guess_latencies.append(time.perf_counter() - started)
+
+            log(f"Current state: {current_word_state} | Guessed so far: {', '.join(sorted(guessed_letters)) or 'None'}")
+            log(f"AI guesses: '{ai_guess}'")
 
-            print(f"Current state: {current_word_state} | Guessed so far: {', '.join(sorted(guessed_letters)) or 'None'}")
-            print(f"AI guesses: '{ai_guess}'")
-            
             if ai_guess in guessed_letters:
-                print(f"AI re-guessed '{ai_guess}'. Skipping.")
-                continue
-            
+                # The Algo is deterministic, so asking again would return the same letter forever.
+                log(f"AI re-guessed '{ai_guess}'. Giving up on this word.")
+                break
+
             guessed_letters.append(ai_guess)
 
             if ai_guess in secret_word_lower:
-                print("Correct guess!")
+                log("Correct guess!")
                 new_state_list = []
                 for char in secret_word_lower:
                     if char in guessed_letters:
@@ -79,78 +101,200 @@ def play_game(secret_word):
                         new_state_list.append('_ ')
                 current_word_state = "".join(new_state_list).strip()
             else:
-                print("Incorrect guess!")
+                log("Incorrect guess!")
                 guesses_remaining -= 1
                 incorrect_guesses.append(ai_guess)
-                print(f"Incorrect guesses: {', '.join(incorrect_guesses)} | Lives remaining: {guesses_remaining}")
+                log(f"Incorrect guesses: {', '.join(incorrect_guesses)} | Lives remaining: {guesses_remaining}")
 
             if '_' not in current_word_state.replace(' ', ''):
-                print(f"SUCCESS! AI guessed '{secret_word}' with {len(incorrect_guesses)} incorrect guesses.")
-                return (True, incorrect_guesses)
+                log(f"SUCCESS! AI guessed '{secret_word}' with {len(incorrect_guesses)} incorrect guesses.")
+                return (True, incorrect_guesses, guess_latencies)
 
         except requests.exceptions.RequestException as e:
             print(f"Error communicating with the API: {e}")
-            return (False, incorrect_guesses)
-        
-        time.sleep(0.5)
+            return (False, incorrect_guesses, guess_latencies)
+
+        if delay:
+            time.sleep(delay)
+
+    log(f"FAILURE! AI could not guess '{secret_word}'. Incorrect guesses: {', '.join(incorrect_guesses)}")
+    return (False, incorrect_guesses, guess_latencies)
+
+
+def play_games(words, guesser=http_guesser, verbose=True, delay=0.5):
+    """Plays one game per word, in order, and returns one result dict per game."""
+    game_results = []
+    for word in words:
+        was_successful, incorrect_guesses_list, latencies = play_game(
+            word, guesser=guesser, verbose=verbose, delay=delay)
+        game_results.append({
+            "word": word,
+            "success": was_successful,
+            "incorrect_guesses": incorrect_guesses_list,
+            "latencies": latencies,
+        })
+    return game_results
+
+
+# The guesser of a worker process, created once per process by the pool initializer.
+_worker_guesser = None
+
+def _init_worker(data_dir, engine, strategy, tiers):
+    """Loads the corpora once per worker process."""
+    global _worker_guesser
+    from hangman_ai import HangmanAI
+    _worker_guesser = in_process_guesser(HangmanAI(data_dir=data_dir, engine=engine, tiers=tiers), strategy=strategy)
+
+def _play_shard(shard):
+    shard_index, words = shard
+    return shard_index, play_games(words, guesser=_worker_guesser, verbose=False, delay=0)
+
+def play_games_parallel(words, workers, data_dir="data", engine="bitmap", strategy=None, tiers="strict",
+                        shards_per_worker=4):
+    """
+    Plays one game per word in-process, spread over a pool of worker processes.
+
+    The word list is cut into contiguous shards (a few per worker, so a slow shard does
+    not hold up the run), and the shard results are put back together in shard order,
+    so the merged results, and the summary computed from them, are the same as those
+    of a sequential run.
+    """
+    num_shards = max(1, min(len(words), workers * shards_per_worker))
+    shard_size = math.ceil(len(words) / num_shards)
+    shards = [(i, words[start:start + shard_size]) for i, start in enumerate(range(0, len(words), shard_size))]
+
+    with multiprocessing.Pool(workers, initializer=_init_worker,
+                              initargs=(data_dir, engine, strategy, tiers)) as pool:
+        shard_results = sorted(pool.imap_unordered(_play_shard, shards), key=lambda result: result[0])
+    return [game for _, games in shard_results for game in games]
+
 
-    print(f"FAILURE! AI could not guess '{secret_word}'. Incorrect guesses: {', '.join(incorrect_guesses)}")
-    return (False, incorrect_guesses)
+def percentile(sorted_values, fraction):
+    """Returns the nearest-rank percentile of an already sorted list (0 if it is empty)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(game_results):
+    """
+    Aggregates per-game results (dicts with 'word', 'success', 'incorrect_guesses' and
+    'latencies') into win rate, average misses and guess latency percentiles.
+    """
+    total = len(game_results)
+    wins = [game for game in game_results if game["success"]]
+    latencies = sorted(latency for game in game_results for latency in game["latencies"])
+    return {
+        "total_words": total,
+        "wins": len(wins),
+        "losses": total - len(wins),
+        "win_rate": len(wins) / total if total else 0.0,
+        "avg_incorrect_guesses": sum(len(game["incorrect_guesses"]) for game in game_results) / total if total else 0.0,
+        "avg_incorrect_guesses_per_win": sum(len(game["incorrect_guesses"]) for game in wins) / len(wins) if wins else 0.0,
+        "total_guesses": len(latencies),
+        "latency_ms": {
+            "mean": 1000 * sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": 1000 * percentile(latencies, 0.50),
+            "p90": 1000 * percentile(latencies, 0.90),
+            "p99": 1000 * percentile(latencies, 0.99),
+            "max": 1000 * latencies[-1] if latencies else 0.0,
+        },
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Plays Hangman games against the Algo and reports how it did.")
+    parser.add_argument("--words", default=TEST_WORDS_FILE,
+                        help="File with the words to play, one per line (e.g. data/airlines_corpus.txt).")
+    parser.add_argument("--offline", action="store_true",
+                        help="Drive HangmanAI in-process instead of calling the API server.")
+    parser.add_argument("--data-dir", default="data", help="Corpus directory for --offline.")
+    parser.add_argument("--engine", default="bitmap", help="Filtering engine for --offline.")
+    parser.add_argument("--strategy", default=None, help="Letter scoring strategy for --offline.")
+    parser.add_argument("--tiers", default="strict", help="Corpus tier mode for --offline (strict or weighted).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of worker processes for --offline (each loads the corpora once).")
+    parser.add_argument("--delay", type=float, default=None,
+                        help="Seconds to sleep after each guess (default: 0.5 over HTTP, 0 offline).")
+    parser.add_argument("--output", default=None, help="Write machine-readable results to this JSON file.")
+    parser.add_argument("--quiet", action="store_true", help="Only print the summary.")
+    return parser.parse_args()
 
 
 def main():
     """
     Main function to run the test harness.
     """
-    test_words = load_test_words(TEST_WORDS_FILE)
+    args = parse_args()
+    test_words = load_test_words(args.words)
     if not test_words:
         print("No words to test. Exiting.")
         return
 
     start_time = time.time()
-    results = {"success": 0, "failure": 0}
-    total_incorrect_guesses_on_wins = 0
-    failed_words_details = []
-
     unique_test_words = sorted(list(set(test_words)))
-    total_words_to_test = len(unique_test_words)
 
-    for word in unique_test_words:
-        was_successful, incorrect_guesses_list = play_game(word)
-        if was_successful:
-            results["success"] += 1
-            total_incorrect_guesses_on_wins += len(incorrect_guesses_list)
-        else:
-            results["failure"] += 1
-            failed_words_details.append({
-                "word": word,
-                "guesses": incorrect_guesses_list
-            })
+    if args.offline and args.workers > 1:
+        game_results = play_games_parallel(unique_test_words, args.workers, data_dir=args.data_dir,
+                                           engine=args.engine, strategy=args.strategy, tiers=args.tiers)
+    elif args.offline:
+        from hangman_ai import HangmanAI
+        ai = HangmanAI(data_dir=args.data_dir, engine=args.engine, tiers=args.tiers)
+        guesser = in_process_guesser(ai, strategy=args.strategy)
+        game_results = play_games(unique_test_words, guesser=guesser, verbose=not args.quiet,
+                                  delay=args.delay or 0)
+    else:
+        delay = 0.5 if args.delay is None else args.delay
+        game_results = play_games(unique_test_words, guesser=http_guesser, verbose=not args.quiet, delay=delay)
 
     end_time = time.time()
     total_duration = end_time - start_time
-    
-    success_rate = (results["success"] / total_words_to_test) * 100 if total_words_to_test > 0 else 0
-    avg_incorrect_guesses = total_incorrect_guesses_on_wins / results["success"] if results["success"] > 0 else 0
+    summary = summarize(game_results)
+    failed_words_details = [game for game in game_results if not game["success"]]
 
     print("\n\n" + "="*40)
     print("        Test Harness Summary")
     print("="*40)
-    print(f"Total words tested: {total_words_to_test}")
-    print(f"Words guessed correctly: {results['success']}")
-    print(f"Success Rate: {success_rate:.2f}%")
-    print(f"Average incorrect guesses per win: {avg_incorrect_guesses:.2f}")
+    print(f"Total words tested: {summary['total_words']}")
+    print(f"Words guessed correctly: {summary['wins']}")
+    print(f"Success Rate: {100 * summary['win_rate']:.2f}%")
+    print(f"Average incorrect guesses per win: {summary['avg_incorrect_guesses_per_win']:.2f}")
+    print(f"Average incorrect guesses per game: {summary['avg_incorrect_guesses']:.2f}")
+    latency = summary["latency_ms"]
+    print(f"Guess latency (ms): p50 {latency['p50']:.3f} | p90 {latency['p90']:.3f} | "
+          f"p99 {latency['p99']:.3f} | max {latency['max']:.3f}")
 
-    if failed_words_details:
+    if failed_words_details and not args.quiet:
         print("\n--- Details of Failed Words ---")
         for item in failed_words_details:
-            guesses_str = ', '.join(item['guesses']) or 'None'
+            guesses_str = ', '.join(item['incorrect_guesses']) or 'None'
             print(f"Word: '{item['word']}' | Failed with incorrect guesses: {guesses_str}")
-    
+
     print(f"\nTotal test duration: {total_duration:.2f} seconds")
     print("="*40)
 
+    if args.output:
+        report = {
+            "config": {
+                "words_file": args.words,
+                "mode": "offline" if args.offline else "http",
+                "engine": args.engine if args.offline else None,
+                "strategy": args.strategy,
+                "tiers": args.tiers if args.offline else None,
+                "workers": args.workers if args.offline else 1,
+            },
+            "duration_seconds": total_duration,
+            "summary": summary,
+            "games": [
+                {key: game[key] for key in ("word", "success", "incorrect_guesses")}
+                for game in game_results
+            ],
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
 
 if __name__ == "__main__":
     main()
-